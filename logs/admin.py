@@ -2,5 +2,7 @@
 from __future__ import unicode_literals
 
 from django.contrib import admin
+from logs.models import JobIngest, ResultSummary
 
-# Register your models here.
+admin.site.register(JobIngest)
+admin.site.register(ResultSummary)
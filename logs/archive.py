@@ -0,0 +1,67 @@
+import os
+import zlib
+
+import numpy
+
+from outputs import proc_out_files
+from reader import compressed_paths
+from sporeweb.settings import WORKING_DIRECTORY, ARCHIVE_BLOCK_SIZE, ARCHIVE_COMPRESSION_LEVEL
+
+
+def compress(filename, block_size=ARCHIVE_BLOCK_SIZE, level=ARCHIVE_COMPRESSION_LEVEL):
+    """
+    Replacing an out file by a gzip file made of separately compressed blocks of whole lines,
+    and an index of the blocks, so that it can still be read from any offset (see logs.reader.BlockReader).
+    Any gzip tool reads the result as one file. The file is read block by block, and the original
+    is removed only once the compressed copy is complete and the file has not grown meanwhile.
+    :param filename: path to the out file
+    :param block_size: number of uncompressed bytes in a block, a block is extended to the end of its last line
+    :return: A pair (size of the file, size of the compressed copy)
+    :raise IOError: if the file was written while it was compressed, it is kept then
+    """
+    path, index_path = compressed_paths(filename)
+    index = []
+    compressed = 0
+    uncompressed = 0
+    lines = 0
+    with open(filename, 'rb') as source, open(path + '.tmp', 'wb') as target:
+        header = True
+        while True:
+            block = source.read(block_size)
+            if block == '':
+                break
+            if not block.endswith('\n'):
+                block += source.readline()
+            index.append((compressed, uncompressed, lines))
+            encoder = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            data = encoder.compress(block) + encoder.flush()
+            target.write(data)
+            compressed += len(data)
+            uncompressed += len(block)
+            # data lines are the non-empty ones after the header, as in logs.reader.OutFile
+            count = sum(1 for line in block.split('\n') if line != '')
+            if header:
+                count -= 1 if block[:1] != '\n' else 0
+                header = False
+            lines += count
+    if os.path.getsize(filename) != uncompressed:
+        os.remove(path + '.tmp')
+        raise IOError('{0} is still being written'.format(filename))
+    index.append((compressed, uncompressed, lines))
+    numpy.array(index, '<i8').tofile(index_path + '.tmp')
+    os.rename(index_path + '.tmp', index_path)
+    os.rename(path + '.tmp', path)
+    os.remove(filename)
+    if os.path.exists(filename + '.idx'):
+        os.remove(filename + '.idx')
+    return uncompressed, compressed
+
+
+def archive_job(job_name):
+    """
+    Compressing out files of a job which has been loaded, the job table and the columnar cache are kept as they are.
+    :return: A pair (size of the files, size of the compressed copies)
+    """
+    filenames = [WORKING_DIRECTORY + '/{0}/out'.format(job_name)] + [path for proc_id, path in proc_out_files(job_name)]
+    sizes = [compress(filename) for filename in filenames if os.path.exists(filename)]
+    return sum(size for size, compressed in sizes), sum(compressed for size, compressed in sizes)
@@ -1,22 +1,40 @@
-import os
-
-from models import FinishedJobs
-from sim.models import JobIdModel
-from sporeweb.settings import WORKING_DIRECTORY
-
-def get_available_finished_jobs():
-    dirnames = []
-    jobs = list(FinishedJobs.objects.order_by('job_name').all())
-    for job in jobs:
-        if os.path.exists('{0}/{1}/out'.format(WORKING_DIRECTORY, job.job_name)):
-            dirnames.append(job.job_name)
-    return dirnames
-
-
-def get_available_unfinished_jobs():
-    dirnames = []
-    jobs = list(JobIdModel.objects.order_by('job_name').all())
-    for job in jobs:
-        if os.path.exists('{0}/{1}/out'.format(WORKING_DIRECTORY, job.job_name)):
-            dirnames.append(job.job_name)
-    return dirnames
\ No newline at end of file
+import hashlib
+
+from django.core.cache import cache
+
+from sim.models import Job
+from sporeweb.settings import LOGS_INDEX_SIZE, LOGS_INDEX_CACHE_TIMEOUT
+
+
+def get_available_jobs(finished, search='', after=None, size=LOGS_INDEX_SIZE):
+    """
+    Getting a page of names of jobs with an out file, in alphabetical order.
+    Whether a job has an out file is stored in sim.models.Job by the ingest daemon, so a page costs
+    range scans of the (has_out, status, job_name) index, one per status, however many jobs there are,
+    and is cached for a while.
+    :param finished: True for finished jobs, False for all the others
+    :param search: a prefix of job names
+    :param after: the last name on the previous page
+    :return: A pair (list of job names, the name to start the next page after or None)
+    """
+    key = 'logs:index:' + hashlib.md5(repr((finished, search, after, size))).hexdigest()
+    page = cache.get(key)
+    if page is None:
+        statuses = ['d'] if finished else [status for status, name in Job.STATUS_CHOICE if status != 'd']
+        jobs = Job.objects.filter(has_out=True, status__in=statuses)
+        if search:
+            jobs = jobs.filter(job_name__startswith=search)
+        if after:
+            jobs = jobs.filter(job_name__gt=after)
+        names = list(jobs.order_by('job_name').values_list('job_name', flat=True)[:size + 1])
+        page = (names[:size], names[size - 1] if len(names) > size else None)
+        cache.set(key, page, LOGS_INDEX_CACHE_TIMEOUT)
+    return page
+
+
+def get_available_finished_jobs(search='', after=None):
+    return get_available_jobs(True, search, after)
+
+
+def get_available_unfinished_jobs(search='', after=None):
+    return get_available_jobs(False, search, after)
@@ -0,0 +1,253 @@
+import os
+import json
+import shutil
+from collections import OrderedDict
+
+import numpy
+
+from sporeweb.settings import WORKING_DIRECTORY
+
+
+def cache_directory(job_name):
+    """ Directory with the columnar copy of a job's results, next to its out file."""
+    return WORKING_DIRECTORY + '/{0}/columns'.format(job_name)
+
+
+def read_schema(directory):
+    """
+    Reading the schema header of a columnar cache.
+    :return: A dictionary {'rows': number of rows, 'columns': [{'name', 'type', 'kind'}, ...]} or None
+    """
+    try:
+        with open(os.path.join(directory, 'schema.json')) as file:
+            return json.load(file)
+    except IOError:
+        return None
+
+
+class ColumnarWriter:
+    """
+    Appending parsed rows to per-column binary files, which can be memory-mapped as NumPy arrays.
+    Numeric columns are stored as little-endian float64, VARCHAR ones as concatenated bytes
+    plus int64 end offsets of every value. The schema header is written by close(),
+    anything appended after the last close() is discarded by the next writer.
+    """
+    def __init__(self, directory, columns, values, append=True):
+        """
+        :param directory: cache directory, created if needed
+        :param columns: a list of logs.parser.Column, the same objects the parser widens
+        :param values: a function getting the first rows values of a column by its name, as batches of strings,
+                       from the table, which a numeric column is rewritten from once it became VARCHAR
+        :param append: False to drop rows stored before
+        """
+        self.directory = directory
+        self.columns = columns
+        self.values = values
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        schema = read_schema(directory) if append else None
+        if schema is not None:
+            self.rows = schema['rows']
+            self.kinds = [column['kind'] for column in schema['columns']]
+        else:
+            self.rows = 0
+            self.kinds = ['str' if column.type == 'VARCHAR' else 'f8' for column in columns]
+        self.ends = []
+        for i, kind in enumerate(self.kinds):
+            self.ends.append(self.truncate(i, kind))
+
+    def path(self, i, extension):
+        return os.path.join(self.directory, '{0}.{1}'.format(i, extension))
+
+    def truncate(self, i, kind):
+        """ Cutting files of a column to the stored number of rows.
+        :return: Length of the string data for VARCHAR columns, 0 for numeric ones"""
+        end = 0
+        if kind == 'str':
+            with open(self.path(i, 'idx'), 'ab+') as file:
+                file.truncate(self.rows * 8)
+                if self.rows > 0:
+                    file.seek((self.rows - 1) * 8)
+                    end = int(numpy.frombuffer(file.read(8), '<i8')[0])
+            with open(self.path(i, 'str'), 'ab+') as file:
+                file.truncate(end)
+        else:
+            with open(self.path(i, 'f8'), 'ab+') as file:
+                file.truncate(self.rows * 8)
+        return end
+
+    def convert(self, i):
+        """
+        Rewriting a numeric column as strings once it became VARCHAR. The strings are read from the table,
+        since float64 values stored before do not keep their original text (e.g. '0.50', '1e5' or
+        integers longer than 15 digits), so the cache holds the same values as the table.
+        """
+        os.remove(self.path(i, 'f8'))
+        for extension in ('str', 'idx'):
+            open(self.path(i, extension), 'wb').close()
+        self.kinds[i] = 'str'
+        self.ends[i] = 0
+        for values in self.values(self.columns[i].name, self.rows):
+            self.append_strings(i, values)
+
+    def append_strings(self, i, values):
+        ends = numpy.cumsum([len(v) for v in values], dtype='<i8') + self.ends[i]
+        with open(self.path(i, 'str'), 'ab') as file:
+            file.write(''.join(values))
+        with open(self.path(i, 'idx'), 'ab') as file:
+            file.write(ends.tobytes())
+        if len(values) > 0:
+            self.ends[i] = int(ends[-1])
+
+    def append(self, rows):
+        """ Appending a batch of rows, each one a list of string values."""
+        for i, column in enumerate(self.columns):
+            if column.type == 'VARCHAR' and self.kinds[i] != 'str':
+                self.convert(i)
+            values = [row[i] for row in rows]
+            if self.kinds[i] == 'str':
+                self.append_strings(i, values)
+            else:
+                with open(self.path(i, 'f8'), 'ab') as file:
+                    file.write(numpy.fromiter((float(v) for v in values), '<f8', len(values)).tobytes())
+        self.rows += len(rows)
+
+    def append_cache(self, directory, values):
+        """
+        Appending all rows of another cache holding at least the same columns, e.g. one written by another process,
+        by copying its files. A column stored as numbers there, but VARCHAR here, is rewritten from values instead.
+        :param values: a function getting values of a column of the other cache, as the one of __init__
+        """
+        schema = read_schema(directory)
+        rows = schema['rows']
+        names = [column['name'] for column in schema['columns']]
+        for i, column in enumerate(self.columns):
+            if column.type == 'VARCHAR' and self.kinds[i] != 'str':
+                self.convert(i)
+            j = names.index(column.name)
+            path = os.path.join(directory, str(j))
+            if self.kinds[i] == 'str' and schema['columns'][j]['kind'] != 'str':
+                for batch in values(column.name, rows):
+                    self.append_strings(i, batch)
+            elif self.kinds[i] == 'str':
+                ends = numpy.fromfile(path + '.idx', '<i8', rows) + self.ends[i]
+                with open(path + '.str', 'rb') as source, open(self.path(i, 'str'), 'ab') as target:
+                    shutil.copyfileobj(source, target)
+                with open(self.path(i, 'idx'), 'ab') as file:
+                    file.write(ends.tobytes())
+                if rows > 0:
+                    self.ends[i] = int(ends[-1])
+            else:
+                with open(path + '.f8', 'rb') as source, open(self.path(i, 'f8'), 'ab') as target:
+                    shutil.copyfileobj(source, target)
+        self.rows += rows
+
+    def close(self):
+        """ Writing the schema header, making appended rows visible to readers."""
+        for i, column in enumerate(self.columns):
+            if column.type == 'VARCHAR' and self.kinds[i] != 'str':
+                self.convert(i)
+        schema = {
+            'rows': self.rows,
+            'columns': [{'name': c.name, 'type': c.type, 'kind': kind} for c, kind in zip(self.columns, self.kinds)],
+        }
+        filename = os.path.join(self.directory, 'schema.json')
+        with open(filename + '.tmp', 'w') as file:
+            json.dump(schema, file)
+        os.rename(filename + '.tmp', filename)
+
+
+class StringColumn:
+    """ Values of a VARCHAR column, sliced out of the memory-mapped data only when accessed."""
+    def __init__(self, data, ends):
+        self.data = data
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        start = int(self.ends[i - 1]) if i > 0 else 0
+        return self.data[start:int(self.ends[i])].tobytes()
+
+
+def memmap(filename, dtype, length):
+    if length == 0:
+        return numpy.zeros(0, dtype)
+    return numpy.memmap(filename, dtype, mode='r', shape=(length,))
+
+
+def read_columns(directory):
+    """
+    Mapping a columnar cache into memory without reading it.
+    :return: An OrderedDict name -> NumPy float64 array for numeric columns or StringColumn
+             for VARCHAR ones, None if there is no cache in the directory
+    """
+    schema = read_schema(directory)
+    if schema is None:
+        return None
+    rows = schema['rows']
+    columns = OrderedDict()
+    for i, column in enumerate(schema['columns']):
+        path = os.path.join(directory, str(i))
+        if column['kind'] == 'str':
+            ends = memmap(path + '.idx', '<i8', rows)
+            data = memmap(path + '.str', 'u1', int(ends[-1]) if rows > 0 else 0)
+            columns[column['name']] = StringColumn(data, ends)
+        else:
+            columns[column['name']] = memmap(path + '.f8', '<f8', rows)
+    return columns
+
+
+def sorted_path(directory, i, rows):
+    return os.path.join(directory, '{0}.{1}'.format(i, rows))
+
+
+def build_sort_indexes(directory):
+    """
+    Storing values of every numeric column in ascending order together with their row numbers,
+    so that a range of values can be found by a binary search (see sort_index).
+    Run by the ingest daemon once a job has been loaded completely, arrays stored for
+    another number of rows are removed.
+    """
+    schema = read_schema(directory)
+    if schema is None:
+        return
+    rows = schema['rows']
+    for i, column in enumerate(schema['columns']):
+        path = sorted_path(directory, i, rows)
+        if column['kind'] != 'f8' or os.path.exists(path + '.order'):
+            continue
+        values = memmap(os.path.join(directory, '{0}.f8'.format(i)), '<f8', rows)
+        order = numpy.argsort(values, kind='mergesort').astype('<i8')
+        values[order].tofile(path + '.sorted.tmp')
+        order.tofile(path + '.order.tmp')
+        os.rename(path + '.sorted.tmp', path + '.sorted')
+        os.rename(path + '.order.tmp', path + '.order')
+    for filename in os.listdir(directory):
+        parts = filename.split('.')
+        if parts[-1] in ('sorted', 'order', 'tmp') and len(parts) > 2 and parts[1] != str(rows):
+            os.remove(os.path.join(directory, filename))
+
+
+def sort_index(directory, name):
+    """
+    Getting values of a numeric column in ascending order together with their row numbers,
+    as stored by build_sort_indexes.
+    :return: A pair of memory-mapped arrays (sorted float64 values, int64 row numbers),
+             None if they have not been stored for the current number of rows
+    :raise ValueError: if there is no such numeric column
+    """
+    schema = read_schema(directory)
+    names = [column['name'] for column in schema['columns']] if schema is not None else []
+    if name not in names or schema['columns'][names.index(name)]['kind'] != 'f8':
+        raise ValueError('Not a numeric column: ' + name)
+    rows = schema['rows']
+    path = sorted_path(directory, names.index(name), rows)
+    if not os.path.exists(path + '.order'):
+        return None
+    return memmap(path + '.sorted', '<f8', rows), memmap(path + '.order', '<i8', rows)
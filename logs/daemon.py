@@ -1,25 +1,278 @@
+import os
+import json
+from multiprocessing import Pool
+
 from htcondor import Schedd
 from classad import ExprTree
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, connections, transaction
+from django.db.models import F
+
+from sim.models import Job, SubmittedCluster
+from sim.spec_factory import job_in_queue
+from sporeweb.settings import WORKING_DIRECTORY, INGEST_WORKERS, HISTORY_CHECK_WINDOW
+from models import JobIngest, HistoryCheckpoint
+from parser import parse, parse_procs, load_columns, dump_columns, index_table, PROC_ID_COLUMN
+from columnar import cache_directory, build_sort_indexes
+from rollup import Rollup
+from procs import ProcTagger
+from outputs import proc_out_files
+from reader import out_exists, out_size, index_out_file
+from archive import archive_job
+
+
+def load_out_file(ingest, final):
+    """
+    Appending lines of a job's out file written since the previous load to the job table.
+    Per-proc out files are loaded by INGEST_WORKERS processes and their rows are tagged with the proc index,
+    rows of a single out file of a job submitted with recorded parameters are tagged by them (see logs.procs).
+    The table, per-parameter statistics (see logs.rollup), the stored JobIngest progress
+    and the row count of the job are updated in one transaction. Once the job is loaded completely,
+    the table is indexed and numeric columns of the columnar cache are sorted for plots.
+    :param ingest: logs.models.JobIngest of the job
+    :param final: True if the job has finished and the file will not grow anymore
+    :return: Number of loaded rows
+    """
+    filename = WORKING_DIRECTORY + '/{0}/out'.format(ingest.job_name)
+    files = proc_out_files(ingest.job_name)
+    job = Job.objects.filter(job_name=ingest.job_name).first()
+    with transaction.atomic():
+        rollup = Rollup(ingest.job_name, job.parameters.split() if job is not None else [])
+        if files:
+            rows, offsets, columns = parse_procs(files, ingest.job_name, json.loads(ingest.offsets or '{}'),
+                                                 load_columns(ingest.columns), final,
+                                                 cache_directory(ingest.job_name), rollup, INGEST_WORKERS)
+            ingest.offsets = json.dumps(offsets)
+        else:
+            columns = load_columns(ingest.columns)
+            procs = None
+            # recorded parameters are only needed when the table is created or has been tagged before,
+            # jobs submitted before parameters of procs were recorded are not tagged
+            if job is not None and (columns is None or columns[-1].name == PROC_ID_COLUMN):
+                procs = ProcTagger(job.cluster_id)
+                if len(procs.procs) == 0:
+                    procs = None
+            rows, ingest.offset, columns = parse(filename, ingest.job_name, ingest.offset, columns, final,
+                                                 cache_directory(ingest.job_name), rollup, procs)
+        if columns is not None:
+            ingest.columns = dump_columns(columns)
+            rollup.save(columns)
+            if final:
+                with connection.cursor() as cursor:
+                    index_table(cursor, ingest.job_name, columns)
+                build_sort_indexes(cache_directory(ingest.job_name))
+        ingest.final = final
+        ingest.version += 1
+        ingest.save()
+        Job.objects.filter(job_name=ingest.job_name).update(rows=F('rows') + rows)
+    return rows
+
+
+def index_out_files(job_name, final):
+    """
+    Indexing lines of plain out files of a job whose results are not in the database,
+    so that the logs detail view can page through them without scanning the files (see logs.reader.OutFile).
+    :param final: False if the files may still be written
+    """
+    files = [path for proc_id, path in proc_out_files(job_name)] or [WORKING_DIRECTORY + '/{0}/out'.format(job_name)]
+    for filename in files:
+        if os.path.exists(filename):
+            index_out_file(filename, final)
+
+
+def ingest_job(task):
+    """
+    Loading the rest of an out file of a finished job, moving the job to Finished
+    and compressing its out files (see logs.archive) if none of its procs is left in the queue.
+    The final load is committed together with JobIngest.final, so a load interrupted after it
+    is not done again when it is carried on, the job is only moved to Finished then.
+    Runs in a worker process with its own database connection.
+    :param task: a pair (job_name, True if the out files are not written anymore and can be compressed)
+    :return: A pair (job_name, error message or None)
+    """
+    job_name, archive = task
+    ingest, created = JobIngest.objects.get_or_create(job_name=job_name)
+    try:
+        if not ingest.final:
+            load_out_file(ingest, True)
+    except Exception as e:
+        index_out_files(job_name, True)
+        return job_name, repr(e)
+    Job.transition(job_name, ['i'], 'd', has_out=True)
+    if archive:
+        try:
+            archive_job(job_name)
+        except (IOError, OSError):
+            pass    # the results are loaded anyway, files left uncompressed are compressed by manage.py archive_logs
+    return job_name, None
+
+
+def ingest_jobs(job_names, sources=('q', 'r'), schedd=None):
+    """
+    Loading out files of finished jobs concurrently by up to INGEST_WORKERS processes.
+    Every job is claimed by moving it to Ingesting first and is then moved to Finished by ingest_job
+    or to Failed here, so a job is loaded once even if several daemons are running.
+    SQLite allows only one writer at a time, so there jobs are loaded one by one.
+    :param job_names: names of sim.models.Job
+    :param sources: statuses jobs are taken in, ('i',) to carry on loads interrupted by a crash
+    :param schedd: htcondor.Schedd the jobs were submitted to, out files of a job are compressed only
+                   once none of its procs is left there, and never without it
+    """
+    job_names = [job_name for job_name in job_names if Job.transition(job_name, sources, 'i')]
+    tasks = [(job_name, schedd is not None and not job_in_queue(schedd, job_name)) for job_name in job_names]
+
+    pool = None
+    if INGEST_WORKERS > 1 and len(tasks) > 1 and connection.vendor != 'sqlite':
+        # Workers must open their own connections instead of sharing the forked one
+        connections.close_all()
+        pool = Pool(INGEST_WORKERS)
+        results = pool.imap_unordered(ingest_job, tasks)
+    else:
+        results = (ingest_job(task) for task in tasks)
+
+    for job_name, error in results:
+        if error is not None:
+            Job.transition(job_name, ['i'], 'f', error=error)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
 
-from sim.models import JobIdModel
-from sporeweb.settings import WORKING_DIRECTORY
-from models import FinishedJobs
-from parser import parse
+def resume_ingest(schedd=None):
+    """
+    Loading jobs which were being loaded when the daemon stopped, the load goes on from the stored offset.
+    :param schedd: htcondor.Schedd the jobs were submitted to, see ingest_jobs
+    """
+    ingest_jobs(list(Job.objects.filter(status='i').values_list('job_name', flat=True)), ['i'], schedd)
 
-def check_history():
-    schedd = Schedd()
-    jobs = list(schedd.history(ExprTree('true'), ["ClusterId"], -1))
 
-    for job in jobs:
+def history_constraint(cluster_ids, completion_date):
+    """ Making a ClassAd constraint matching given clusters completed not earlier than completion_date."""
+    return 'member(ClusterId, {{{0}}}) && CompletionDate >= {1}'.format(
+        ', '.join(str(cluster_id) for cluster_id in cluster_ids), completion_date)
+
+
+def check_history(schedd=None):
+    """
+    Loading results of tracked jobs which appeared in HTCondor history since the last check.
+    Only records of clusters of queued and running jobs completed after the stored HistoryCheckpoint,
+    less HISTORY_CHECK_WINDOW seconds for records written late, are requested; jobs which are already
+    loaded are not tracked anymore, so records requested again are skipped by the job status.
+    A job with a record is loaded only once none of its procs is left in the queue, since procs
+    of a job, even of one cluster, leave the queue one by one. Its last proc leaves a record later on.
+    Jobs which are still being submitted are not checked.
+    :param schedd: htcondor.Schedd to query, the local one by default
+    """
+    clusters = dict(Job.objects.filter(status__in=['q', 'r'], cluster_id__gte=0).values_list('cluster_id', 'job_name'))
+    clusters.update(SubmittedCluster.objects.filter(job_name__in=clusters.values())
+                    .values_list('cluster_id', 'job_name'))
+    if len(clusters) == 0:
+        return
+    checkpoint = HistoryCheckpoint.get()
+
+    if schedd is None:
+        schedd = Schedd()
+    since = max(checkpoint.completion_date - HISTORY_CHECK_WINDOW, 0)
+    records = list(schedd.history(ExprTree(history_constraint(sorted(clusters.keys()), since)),
+                                  ["ClusterId", "CompletionDate"], -1))
+    if len(records) == 0:
+        return
+
+    job_names = set(clusters[record["ClusterId"]] for record in records if record["ClusterId"] in clusters)
+    ingest_jobs([job_name for job_name in sorted(job_names) if not job_in_queue(schedd, job_name)], schedd=schedd)
+
+    latest = max(records, key=lambda record: record["CompletionDate"])
+    if latest["CompletionDate"] > checkpoint.completion_date:
+        checkpoint.cluster_id = latest["ClusterId"]
+        checkpoint.completion_date = latest["CompletionDate"]
+        checkpoint.save()
+
+
+class LogWatcher:
+    """
+    Following the HTCondor user log of a job to find out when all of its procs have left the queue.
+    Procs of a job submitted in several clusters are all in its log, in clusters starting with the first one.
+    """
+    def __init__(self, job_name, cluster_id, event_log):
+        self.job_name = job_name
+        self.cluster_id = cluster_id
+        self.event_log = event_log
+        self.submitted = set()
+        self.done = set()
+
+    def poll(self):
+        """
+        Reading events appended to the log since the previous call without waiting for new ones.
+        :return: True if every submitted proc of the job has terminated or was aborted
+        """
+        # user log events are only available in HTCondor 8.7.10 or later, see check_events
+        from htcondor import JobEventType
+        for event in self.event_log.events(stop_after=0):
+            if event.cluster < self.cluster_id:
+                continue
+            if event.type == JobEventType.SUBMIT:
+                self.submitted.add((event.cluster, event.proc))
+            elif event.type in (JobEventType.JOB_TERMINATED, JobEventType.JOB_ABORTED):
+                self.done.add((event.cluster, event.proc))
+        return len(self.submitted) > 0 and self.submitted <= self.done
+
+
+def ingest_running_jobs():
+    """
+    Loading lines appended to out files of running jobs since the previous call,
+    so that their results can be viewed before they finish.
+    Jobs are marked as having an out file for the logs index page when it appears,
+    queued jobs are running from then on. Out files of jobs which could not be loaded are indexed
+    instead, so that their lines can still be viewed.
+    """
+    for job in Job.objects.filter(status__in=['s', 'q', 'r'], cluster_id__gte=0):
+        filename = WORKING_DIRECTORY + '/{0}/out'.format(job.job_name)
+        files = proc_out_files(job.job_name)
+        if not files and not out_exists(filename):
+            continue
+        if job.status == 'q':
+            Job.transition(job.job_name, ['q'], 'r', has_out=True)
+        elif not job.has_out:
+            Job.objects.filter(job_name=job.job_name).update(has_out=True)
+        ingest, created = JobIngest.objects.get_or_create(job_name=job.job_name)
+        if files:
+            offsets = json.loads(ingest.offsets or '{}')
+            if all(out_size(path) == offsets.get(str(proc_id), 0) for proc_id, path in files):
+                continue
+        elif out_size(filename) == ingest.offset:
+            continue
         try:
-            job_by_id = JobIdModel.objects.get(cluster_id=job["ClusterId"])
-        except ObjectDoesNotExist:
-            job_by_id = None
-
-        if job_by_id != None:
-            filename = WORKING_DIRECTORY + '/{0}/out'.format(job_by_id.job_name)
-            parse(filename, job_by_id.job_name)
-            finished_job = FinishedJobs(job_name=job_by_id.job_name, cluster_id=job_by_id.cluster_id)
-            finished_job.save()
-            job_by_id.delete()
\ No newline at end of file
+            load_out_file(ingest, False)
+        except Exception as e:
+            Job.transition(job.job_name, ['s', 'q', 'r'], 'f', error=repr(e))
+
+    # procs of a failed job may still be writing
+    for job_name in Job.objects.filter(status='f').values_list('job_name', flat=True):
+        ingest = JobIngest.objects.filter(job_name=job_name).first()
+        if ingest is not None and load_columns(ingest.columns) is None:
+            index_out_files(job_name, False)
+
+
+def check_events(watchers, event_log=None, schedd=None):
+    """
+    Polling user logs of all tracked jobs once and loading results of the jobs which have terminated.
+    :param watchers: a dictionary job_name -> LogWatcher, kept between calls
+    :param event_log: a callable opening a user log by its path, htcondor.JobEventLog by default
+    :param schedd: htcondor.Schedd the jobs were submitted to, see ingest_jobs
+    """
+    if event_log is None:
+        # imported here, so that the rest of the module works with HTCondor versions before 8.7.10
+        from htcondor import JobEventLog as event_log
+    jobs = dict((job.job_name, job) for job in Job.objects.filter(status__in=['s', 'q', 'r'], cluster_id__gte=0))
+
+    for job_name in list(watchers.keys()):
+        if job_name not in jobs:
+            del watchers[job_name]
+    for job_name, job in jobs.items():
+        filename = WORKING_DIRECTORY + '/{0}/log'.format(job_name)
+        if job_name not in watchers and os.path.exists(filename):
+            watchers[job_name] = LogWatcher(job_name, job.cluster_id, event_log(filename))
+
+    # a job some procs of which are not submitted yet can not be finished
+    ingest_jobs([job_name for job_name, watcher in watchers.items()
+                 if watcher.poll() and jobs[job_name].status != 's'], schedd=schedd)
@@ -0,0 +1,91 @@
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+from models import JobIngest
+from parser import load_columns, quote
+from results import check_columns
+from sporeweb.settings import EXPORT_CHUNK_SIZE
+
+
+class Echo:
+    """ A file-like object returning what is written to it, to get lines out of csv.writer."""
+    def write(self, value):
+        return value
+
+
+def encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, float):
+        return repr(value)
+    return value
+
+
+def table_chunks(job_name, names):
+    """
+    Reading a job table in loading order by EXPORT_CHUNK_SIZE rows, through a server-side
+    cursor where the database supports it, so that the table is never held in memory.
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(quote(name) for name in names) + ' FROM ' + quote(job_name) +
+                       ' ORDER BY row_id')
+        rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        while rows:
+            yield rows
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+
+
+def csv_parts(names, chunks):
+    writer = csv.writer(Echo())
+    yield writer.writerow(names)
+    for rows in chunks:
+        yield ''.join(writer.writerow([encode(v) for v in row]) for row in rows)
+
+
+def json_parts(names, chunks):
+    """ Writing rows as a JSON array of objects, a chunk at a time."""
+    yield '['
+    separator = '\n'
+    for rows in chunks:
+        yield separator + ',\n'.join(json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) for row in rows)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def gzipped(parts):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+FORMATS = {
+    'csv': csv_parts,
+    'json': json_parts,
+}
+
+
+def export_parts(job_name, format, columns=None, compress=False):
+    """
+    Getting a generator of the exported results of a job, to be sent with StreamingHttpResponse.
+    Nothing is read from the database until the generator is iterated.
+    :param format: 'csv' or 'json'
+    :param columns: names of exported columns, all of them by default
+    :param compress: True to gzip the output
+    :raise ValueError: if the job was not loaded or a column is unknown
+    """
+    ingest = JobIngest.objects.filter(job_name=job_name).first()
+    table_columns = load_columns(ingest.columns) if ingest is not None else None
+    if table_columns is None:
+        raise ValueError('Results of the job are not loaded yet')
+    names = check_columns(table_columns, columns)
+    parts = FORMATS[format](names, table_chunks(job_name, names))
+    if compress:
+        parts = gzipped(parts)
+    return parts
@@ -0,0 +1,27 @@
+from htcondor import Schedd
+from django.core.management.base import BaseCommand
+
+from logs.archive import archive_job
+from sim.models import Job
+from sim.spec_factory import job_in_queue
+
+
+class Command(BaseCommand):
+    help = 'Compresses out files of loaded jobs which are still kept uncompressed and have left the queue.'
+
+    def handle(self, *args, **options):
+        schedd = Schedd()
+        total = 0
+        compressed = 0
+        for job_name in Job.objects.filter(status='d').values_list('job_name', flat=True).iterator():
+            if job_in_queue(schedd, job_name):
+                continue
+            try:
+                size, compressed_size = archive_job(job_name)
+            except (IOError, OSError) as e:
+                self.stderr.write('{0}: {1}'.format(job_name, e))
+                continue
+            total += size
+            compressed += compressed_size
+        if total > 0:
+            self.stdout.write('Compressed {0} MB of out files to {1} MB'.format(total >> 20, compressed >> 20))
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from logs.parser import parse
+from logs.columnar import read_columns
+
+
+class Command(BaseCommand):
+    help = 'Compares scanning result columns from a job table and from its columnar cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Number of generated result rows')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, 'out')
+        with open(filename, 'w') as file:
+            file.write('#[spec][snr][n][fer]\n')
+            for i in range(options['rows']):
+                file.write('R_0.17_N_1024_K_{0}.xpec {1}.{2:03d} {0} {3:.5e}\n'.format(i, i % 10, i % 1000, 1.0 / (i + 1)))
+
+        start = time()
+        parse(filename, 'bench_columns', cache_dir=os.path.join(directory, 'columns'))
+        self.stdout.write('Parsing: {0:.3f} s'.format(time() - start))
+
+        start = time()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT snr, fer FROM bench_columns')
+            total = sum(float(snr) * fer for snr, fer in cursor.fetchall())
+        self.stdout.write('SQL table scan: {0:.3f} s ({1})'.format(time() - start, total))
+
+        start = time()
+        columns = read_columns(os.path.join(directory, 'columns'))
+        total = (columns['snr'] * columns['fer']).sum()
+        self.stdout.write('Columnar cache scan: {0:.3f} s ({1})'.format(time() - start, total))
+
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE bench_columns')
+        shutil.rmtree(directory)
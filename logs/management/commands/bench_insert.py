@@ -0,0 +1,54 @@
+from time import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from logs.parser import Column, create_table, insert_rows, insert_statement, quote
+
+
+def literal_insert(jobname, columns, values):
+    """ An INSERT with values written into it, as rows were inserted before statements were prepared."""
+    return 'INSERT INTO ' + quote(jobname) + ' (' + ', '.join(quote(c.name) for c in columns) + ') VALUES (' + \
+           ', '.join("'" + v.replace("'", "''") + "'" if c.type == 'VARCHAR' else v
+                     for c, v in zip(columns, values)) + ')'
+
+
+class Command(BaseCommand):
+    help = 'Compares inserting result rows with a literal statement built for every row, with one parameterized ' \
+           'INSERT executed for every row, and with the same INSERT executed for batches of rows, as the parser does.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Number of generated result rows')
+
+    def handle(self, *args, **options):
+        columns = [Column('spec', 'VARCHAR'), Column('snr', 'DECIMAL'), Column('n'), Column('fer', 'FLOAT')]
+        rows = [['R_0.17_N_1024_K_{0}.xpec'.format(i), '{0}.{1:03d}'.format(i % 10, i % 1000), str(i),
+                 '{0:.5e}'.format(1.0 / (i + 1))] for i in range(options['rows'])]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            create_table(cursor, 'bench_literal', columns)
+            start = time()
+            for values in rows:
+                cursor.execute(literal_insert('bench_literal', columns, values))
+            elapsed = time() - start
+            self.stdout.write('Statement per row: {0:.3f} s, {1:.2f} us per row'.format(
+                elapsed, elapsed * 1e6 / len(rows)))
+
+            create_table(cursor, 'bench_parameterized', columns)
+            insert_string = insert_statement('bench_parameterized', columns)
+            start = time()
+            for values in rows:
+                cursor.execute(insert_string, values)
+            elapsed = time() - start
+            self.stdout.write('Parameterized INSERT per row: {0:.3f} s, {1:.2f} us per row'.format(
+                elapsed, elapsed * 1e6 / len(rows)))
+
+            create_table(cursor, 'bench_batched', columns)
+            start = time()
+            insert_rows(cursor, 'bench_batched', columns, rows)
+            elapsed = time() - start
+            self.stdout.write('Parameterized INSERT by batches: {0:.3f} s, {1:.2f} us per row'.format(
+                elapsed, elapsed * 1e6 / len(rows)))
+
+            for table in ('bench_literal', 'bench_parameterized', 'bench_batched'):
+                cursor.execute('DROP TABLE ' + quote(table))
@@ -0,0 +1,28 @@
+from time import sleep, time
+
+from htcondor import Schedd
+from django.core.management.base import BaseCommand
+
+from logs.daemon import check_events, ingest_running_jobs, resume_ingest
+
+
+class Command(BaseCommand):
+    help = 'Follows HTCondor user logs of submitted jobs and loads their results as soon as they terminate.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait between reading the logs')
+        parser.add_argument('--partial-interval', type=float, default=30.0,
+                            help='Seconds to wait between loading new results of running jobs')
+
+    def handle(self, *args, **options):
+        schedd = Schedd()
+        resume_ingest(schedd)
+        watchers = {}
+        last_partial = 0
+        while True:
+            check_events(watchers, schedd=schedd)
+            if time() - last_partial >= options['partial_interval']:
+                ingest_running_jobs()
+                last_partial = time()
+            sleep(options['interval'])
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0003_auto_20171202_1729'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobIngest',
+            fields=[
+                ('job_name', models.CharField(max_length=300, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[(b'q', b'Queued'), (b'r', b'Running'), (b'd', b'Done'), (b'f', b'Failed')], default=b'q', max_length=1)),
+                ('rows', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0004_jobingest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoryCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cluster_id', models.IntegerField(default=0)),
+                ('completion_date', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0005_historycheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobingest',
+            name='columns',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='jobingest',
+            name='offset',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='jobingest',
+            name='status',
+            field=models.CharField(choices=[(b'p', b'Partially loaded'), (b'q', b'Queued'), (b'r', b'Running'), (b'd', b'Done'), (b'f', b'Failed')], default=b'q', max_length=1),
+        ),
+    ]
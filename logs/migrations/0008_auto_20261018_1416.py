@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:16
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0007_jobingest_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_name', models.CharField(max_length=300)),
+                ('parameter', models.CharField(blank=True, max_length=50)),
+                ('value', models.CharField(blank=True, max_length=300)),
+                ('column', models.CharField(max_length=300)),
+                ('count', models.BigIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('m2', models.FloatField(default=0)),
+                ('minimum', models.FloatField(null=True)),
+                ('maximum', models.FloatField(null=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='resultsummary',
+            unique_together=set([('job_name', 'parameter', 'value', 'column')]),
+        ),
+    ]
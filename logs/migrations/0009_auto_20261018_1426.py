@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:26
+from __future__ import unicode_literals
+
+import os
+
+from django.db import migrations, models
+
+from sporeweb.settings import WORKING_DIRECTORY
+
+
+def mark_jobs_with_out(apps, schema_editor):
+    """ Checking out files of existing jobs once, from now on the ingest daemon does it."""
+    model = apps.get_model('logs', 'FinishedJobs')
+    names = [job_name for job_name in model.objects.values_list('job_name', flat=True)
+             if os.path.exists('{0}/{1}/out'.format(WORKING_DIRECTORY, job_name))]
+    model.objects.filter(job_name__in=names).update(has_out=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0008_auto_20261018_1416'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='finishedjobs',
+            name='has_out',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='finishedjobs',
+            index_together=set([('has_out', 'job_name')]),
+        ),
+        migrations.RunPython(mark_jobs_with_out, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:32
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0009_auto_20261018_1426'),
+        ('sim', '0013_auto_20261018_1432'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='FinishedJobs',
+        ),
+        migrations.RemoveField(
+            model_name='jobingest',
+            name='error',
+        ),
+        migrations.RemoveField(
+            model_name='jobingest',
+            name='rows',
+        ),
+        migrations.RemoveField(
+            model_name='jobingest',
+            name='status',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0010_auto_20261018_1432'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobingest',
+            name='offsets',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0011_jobingest_offsets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobingest',
+            name='final',
+            field=models.BooleanField(default=False),
+        ),
+    ]
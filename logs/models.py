@@ -1,7 +1,51 @@
+import math
+
 from django.db import models
 
-class FinishedJobs(models.Model):
-    job_name = models.CharField(max_length=300, primary_key=True, default='null')
-    cluster_id = models.IntegerField()
+class JobIngest(models.Model):
+    """ Progress of loading an out file of a job into the database, the job itself is sim.models.Job.
+    Out files of running jobs are loaded in parts, offset tells how far the file was read."""
+    job_name = models.CharField(max_length=300, primary_key=True)
+    offset = models.BigIntegerField(default=0)
+    offsets = models.TextField(blank=True)     # JSON proc index -> offset, for per-proc out files
+    columns = models.TextField(blank=True)
+    version = models.IntegerField(default=0)    # incremented on every load, invalidates cached pages
+    final = models.BooleanField(default=False)  # the finished job has been loaded completely and indexed
+
     def __unicode__(self):
-        return self.job_name
\ No newline at end of file
+        return self.job_name
+
+
+class HistoryCheckpoint(models.Model):
+    """ The latest HTCondor history record processed by logs.daemon.check_history,
+    so that older records are not requested again."""
+    cluster_id = models.IntegerField(default=0)
+    completion_date = models.IntegerField(default=0)
+
+    @classmethod
+    def get(cls):
+        checkpoint, created = cls.objects.get_or_create(pk=1)
+        return checkpoint
+
+
+class ResultSummary(models.Model):
+    """ Statistics of a numeric result column over the rows of a job with one value of a sweep
+    parameter, computed while the job is loaded (see logs.rollup). An empty parameter stands for all rows."""
+    job_name = models.CharField(max_length=300)
+    parameter = models.CharField(max_length=50, blank=True)
+    value = models.CharField(max_length=300, blank=True)
+    column = models.CharField(max_length=300)
+    count = models.BigIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)    # sum of squared deviations from the mean
+    minimum = models.FloatField(null=True)
+    maximum = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ('job_name', 'parameter', 'value', 'column')
+
+    @property
+    def stddev(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
@@ -0,0 +1,27 @@
+import os
+import re
+
+from sporeweb.settings import WORKING_DIRECTORY
+
+# Names of per-proc out files, numbered by the index of the proc in its job (see sim.spec_factory.submit),
+# and of their compressed copies (see logs.archive)
+PROC_OUT = re.compile(r'(out\.(\d+))(?:\.gz)?$')
+
+
+def proc_out_files(job_name):
+    """
+    Finding per-proc out files of a job, jobs submitted before procs got their own files have a single out.
+    :return: A list of pairs (proc index, path to the file) ordered by proc index, paths of
+             compressed files are the paths they had before they were compressed (see logs.reader.open_out)
+    """
+    directory = WORKING_DIRECTORY + '/{0}'.format(job_name)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    files = set()
+    for name in names:
+        match = PROC_OUT.match(name)
+        if match is not None:
+            files.add((int(match.group(2)), os.path.join(directory, match.group(1))))
+    return sorted(files)
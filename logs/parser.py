@@ -1,110 +1,544 @@
+import os
 import re
+import json
+import shutil
+from functools import partial
+from itertools import islice, chain, imap
+from multiprocessing import Pool, current_process
+from StringIO import StringIO
 
-from django.db import connection
+from django.db import connection, connections, transaction
 
+from sporeweb.settings import PARSER_SAMPLE_SIZE, PARSER_BATCH_SIZE
+from columnar import ColumnarWriter
+from reader import open_out, sample_lines, out_size
 
-def isdecimal(str):
-    parts = str.split('.')
-    if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
-        return True
-    return False
 
+# Column types from the narrowest to the widest, every value of a narrower type fits in a wider one
+TYPES = ['INTEGER', 'DECIMAL', 'FLOAT', 'VARCHAR']
 
-def isfloat(str):
-    parts = str.split('e+')
-    if len(parts) == 1:
-        parts = str.split('e-')
-    if len(parts) == 2 and isdecimal(parts[0]) and parts[1].isdigit():
-        return True
-    return False
+NUMBER = re.compile(r'-?(\d+)(?:\.(\d+))?([eE][+-]?\d+)?$')
+
+# Patterns matching all values of a column joined with line breaks, if every one of them is of the type
+COLUMN_TYPES = [
+    ('INTEGER', re.compile(r'(?:-?\d+\n)*\Z')),
+    ('DECIMAL', re.compile(r'(?:-?\d+(?:\.\d+)?\n)*\Z')),
+    ('FLOAT', re.compile(r'(?:-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\n)*\Z')),
+]
+INTEGER_PARTS = re.compile(r'^-?(\d+)', re.M)
+FRACTION_PARTS = re.compile(r'\.(\d+)$', re.M)
+
+
+def classify(str):
+    """
+    Finding a type of a value together with its widths by a single regex match.
+    :return: A tuple (type, integer part length, fractional part length)
+    """
+    match = NUMBER.match(str)
+    if match is None:
+        return 'VARCHAR', 0, 0
+    integer, fraction, exponent = match.groups()
+    if exponent is not None:
+        return 'FLOAT', 0, 0
+    if fraction is not None:
+        return 'DECIMAL', len(integer), len(fraction)
+    return 'INTEGER', len(integer), 0
 
 
 def check_type(str):
-    if str.isdigit():
-        return 'INTEGER'
-    if isdecimal(str):
-        return 'DECIMAL'
-    if isfloat(str):
-        return 'FLOAT'
-    return 'VARCHAR'
-
-
-def make_insert(str, template, jobname):
-    #Creates an SQL query, which inserts row of values into the table
-
-    insert_string = "INSERT INTO " + jobname + "("
-    for t in template[:-1]:
-        insert_string += t[0] + ", "    #adds columns names
-    insert_string += template[-1][0] + ") VALUES ("
-    data = str.split()
-
-    #if VARCHAR value is added, surrounds it with quotes
-    #else lives it unchanged
-    for i, d in enumerate(data[:-1]):
-        if re.match(r'VARCHAR', template[i][1]):
-            insert_string += "'" + d + "', "
-        else:
-            insert_string += d + ", "
-    if re.match(r'VARCHAR', template[-1][1]):
-        insert_string += "'" + data[-1] + "')"
-    else:
-        insert_string += data[-1] + ")"
-    return insert_string
+    return classify(str)[0]
+
+
+def quote(name):
+    """
+    Quoting a table, column or index name for the database in use, so that any name
+    read from an out file header is taken as a name and never as SQL.
+    """
+    mark = '`' if connection.vendor == 'mysql' else '"'
+    return mark + name.replace(mark, mark + mark) + mark
+
+
+def insert_statement(jobname, columns):
+    """
+    Making the parameterized INSERT adding a row to a job table. It is built once per load
+    and used for every batch, so the database driver prepares it once and reuses it.
+    """
+    return 'INSERT INTO ' + quote(jobname) + ' (' + ', '.join(quote(c.name) for c in columns) + \
+           ') VALUES (' + ', '.join(['%s'] * len(columns)) + ')'
+
+
+class Column:
+    """ A result column: its name, SQL type and the widths of the values seen so far."""
+    def __init__(self, name, type='INTEGER'):
+        self.name = name
+        self.type = type
+        self.length = 0     # max length of values, used once the column becomes VARCHAR
+        self.digits = 0     # max integer part length of numeric values
+        self.scale = 0      # max fractional part length of numeric values
+        self.declared = None    # declaration the table was created or altered with
+
+    def fit(self, value):
+        """
+        Growing stored type and widths so that value fits in the column.
+        :param value: string representation of a value
+        :return: True if the column declaration might have changed
+        """
+        return self.fit_values([value])
+
+    def fit_values(self, values):
+        """
+        Growing stored type and widths so that all values fit in the column, classifying them at once:
+        the values are joined and matched by one regex per candidate type, and widths are taken
+        from one findall over the joined values, so no Python code runs per value.
+        The type is only widened (INTEGER -> DECIMAL -> FLOAT -> VARCHAR), never narrowed.
+        :param values: a sequence of string representations of values
+        :return: True if the column declaration might have changed
+        """
+        if len(values) == 0:
+            return False
+        declaration = self.declaration()
+        longest = max(map(len, values))
+        self.length = max(self.length, longest)
+        if self.type != 'VARCHAR':
+            text = '\n'.join(values) + '\n'
+            start = TYPES.index(self.type)
+            self.type = 'VARCHAR'
+            for type, pattern in COLUMN_TYPES[start:]:
+                if pattern.match(text) is not None:
+                    self.type = type
+                    break
+            if self.type == 'INTEGER' and '-' not in text:
+                self.digits = max(self.digits, longest)
+            elif self.type in ('INTEGER', 'DECIMAL'):
+                self.digits = max([self.digits] + map(len, INTEGER_PARTS.findall(text)))
+            if self.type == 'DECIMAL':
+                self.scale = max([self.scale] + map(len, FRACTION_PARTS.findall(text)))
+        return self.declaration() != declaration
+
+    def merge(self, other):
+        """
+        Growing stored type and widths so that values fitting another column fit in this one too.
+        :param other: a Column values were fitted to separately, e.g. by another process
+        :return: True if the column declaration might have changed
+        """
+        declaration = self.declaration()
+        if TYPES.index(self.type) < TYPES.index(other.type):
+            self.type = other.type
+        self.length = max(self.length, other.length)
+        self.digits = max(self.digits, other.digits)
+        self.scale = max(self.scale, other.scale)
+        return self.declaration() != declaration
+
+    def declaration(self):
+        if self.type == 'VARCHAR':
+            return 'VARCHAR(' + str(self.length) + ')'
+        if self.type == 'DECIMAL':
+            return 'DECIMAL(' + str(self.digits + self.scale) + ',' + str(self.scale) + ')'
+        return self.type
+
+
+def read_header(header):
+    """
+    Reading column names from the first line of an out file, i.e. '#[spec][snr][fer]'.
+    :return: A list of column names
+    """
+    #checks if the syntax is correct
+    if header[:1] != '#':
+        raise SyntaxError
+    return header[1:].strip('[]\n').split('][')
+
+
+class LineReader:
+    """ Iterating over non-empty data lines of an opened out file, remembering the offset after the last one."""
+    def __init__(self, file, final=True, end=None):
+        """
+        :param file: a file opened for reading
+        :param final: False if the file is still being written, then a trailing line
+                      without a line break is not read
+        :param end: offset of a line boundary to stop at, None to read up to the end of the file
+        """
+        self.file = file
+        self.final = final
+        self.end = end
+        self.offset = file.tell()
+
+    def __iter__(self):
+        while self.end is None or self.offset < self.end:
+            line = self.file.readline()
+            if line == '' or not self.final and not line.endswith('\n'):
+                break
+            self.offset += len(line)
+            if line.strip() != '':
+                yield line
+
+
+def infer_columns(names, sample):
+    """
+    Guessing column types and widths from a sample, classifying every column at once.
+    :param names: column names
+    :param sample: a list of data lines
+    :return: A list of Column objects
+    """
+    rows = [line.split() for line in sample]
+    columns = [Column(name) for name in names[:len(rows[0])]]
+    fit_columns(columns, rows)
+    return columns
+
+
+# Declarations of the row_id column numbering rows of every job table in the order they were loaded
+ROW_ID_DECLARATIONS = {
+    'postgresql': 'BIGSERIAL PRIMARY KEY',
+    'mysql': 'BIGINT AUTO_INCREMENT PRIMARY KEY',
+    'sqlite': 'INTEGER PRIMARY KEY',
+}
+
+
+def create_table(cursor, jobname, columns):
+    #concatenates an SQL query for table creation
+    init_string = 'CREATE TABLE ' + quote(jobname) + ' (row_id ' + ROW_ID_DECLARATIONS[connection.vendor] + ', '
+    init_string += ', '.join(quote(c.name) + ' ' + c.declaration() for c in columns)
+    init_string += ')'
+    cursor.execute(init_string)
+    for column in columns:
+        column.declared = column.declaration()
+
+
+def widen_column(cursor, jobname, columns, column):
+    """ Altering a declared column type after the table has been created, if it has changed."""
+    declaration = column.declaration()
+    if declaration == column.declared:
+        return
+    if connection.vendor == 'postgresql':
+        cursor.execute('ALTER TABLE ' + quote(jobname) + ' ALTER COLUMN ' + quote(column.name) + ' TYPE ' + declaration)
+    elif connection.vendor == 'mysql':
+        cursor.execute('ALTER TABLE ' + quote(jobname) + ' MODIFY ' + quote(column.name) + ' ' + declaration)
+    elif column.declared.split('(')[0] != column.type:
+        # SQLite does not enforce declared lengths, but converts values by declared types,
+        # and it can not alter a column, so the table is copied with new declarations
+        names = ', '.join(['row_id'] + [quote(c.name) for c in columns])
+        old = quote(jobname + '__old')
+        cursor.execute('ALTER TABLE ' + quote(jobname) + ' RENAME TO ' + old)
+        create_table(cursor, jobname, columns)
+        cursor.execute('INSERT INTO ' + quote(jobname) + ' (' + names + ') SELECT ' + names + ' FROM ' + old)
+        cursor.execute('DROP TABLE ' + old)
+    column.declared = declaration
+
+
+def index_table(cursor, jobname, columns):
+    """ Indexing every column of a table which will not be changed anymore, so that it can be sorted by any of them."""
+    for column in columns:
+        cursor.execute('CREATE INDEX ' + quote(jobname + '__' + column.name) + ' ON ' + quote(jobname) +
+                       ' (' + quote(column.name) + ', row_id)')
+
+
+# Name of the column holding ProcId of the proc which produced a row, see logs.procs
+PROC_ID_COLUMN = 'proc_id'
 
 
-def parse(filename, jobname):
-    with open(filename, mode='r') as file:
-        lines = file.readlines()
+def fit_columns(columns, rows):
+    """
+    Fitting columns to a batch of rows, one column at a time.
+    :param rows: a list of lists of string values
+    :return: A list of columns whose declaration might have changed
+    """
+    return [column for column, values in zip(columns, zip(*rows)) if column.fit_values(values)]
 
-        #checks if the syntax is correct
-        if lines[0][0] == '#':
-            columns = lines[0][1:].strip('[]\n').split('][')
+
+def fit_rows(cursor, jobname, columns, lines, tag=None):
+    """
+    Splitting lines into values by batches of PARSER_BATCH_SIZE lines, widening columns which are
+    too narrow for a batch before any of its rows is yielded.
+    :param tag: a function getting a ProcId string by values of a line, appended to them, if any
+    """
+    for batch in batches(lines, PARSER_BATCH_SIZE):
+        rows = [line.split() for line in batch]
+        if tag is not None:
+            for values in rows:
+                values.append(tag(values))
+        for column in fit_columns(columns, rows):
+            widen_column(cursor, jobname, columns, column)
+        for values in rows:
+            yield values
+
+
+def batches(rows, size):
+    """ Lazily splitting rows into lists of at most size rows."""
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+def copy_rows(cursor, jobname, columns, rows):
+    """ Sending a batch of rows with PostgreSQL COPY FROM STDIN."""
+    data = StringIO(''.join('\t'.join(v.replace('\\', '\\\\') for v in values) + '\n' for values in rows))
+    names = ', '.join(quote(c.name) for c in columns)
+    cursor.copy_expert('COPY ' + quote(jobname) + ' (' + names + ') FROM STDIN', data)
+
+
+def insert_rows(cursor, jobname, columns, rows, writer=None, rollup=None):
+    """
+    Inserting rows into a job table by batches of PARSER_BATCH_SIZE rows,
+    using one prepared parameterized INSERT for all of them (COPY on PostgreSQL).
+    :param rows: iterable of lists of string values
+    :param writer: logs.columnar.ColumnarWriter also receiving every batch, if any
+    :param rollup: logs.rollup.Rollup also receiving every batch, if any
+    :return: Number of inserted rows
+    """
+    insert_string = insert_statement(jobname, columns)
+    count = 0
+    for batch in batches(rows, PARSER_BATCH_SIZE):
+        if connection.vendor == 'postgresql':
+            copy_rows(cursor, jobname, columns, batch)
         else:
-            raise SyntaxError
-
-        types = []
-        values = lines[1].split()
-        for v in values:
-            types.append(check_type(v))
-
-        #creates a list, containing max length for VARCHAR values and max precisions for DECIMAL ones
-        max_length = []
-        for t in types:
-            if t == 'VARCHAR':
-                max_length.append(0)
-            elif t == 'DECIMAL':
-                max_length.append([0,0])
-            else:
-                max_length.append(None)
-
-        #finds max length and precisions
-        for line in lines[1:]:
-            values = line.split()
-            for i, v in enumerate(values):
-                if type(max_length[i]) is int and max_length[i] < len(v):
-                    max_length[i] = len(v)
-                elif type(max_length[i]) is list and max_length[i][0] < len(v.split('.')[0]):
-                    max_length[i][0] = len(v.split('.')[0])
-                elif type(max_length[i]) is list and max_length[i][1] < len(v.split('.')[1]):
-                    max_length[i][1] = len(v.split('.')[1])
-
-        #adds obtained max length and precisions to type declarations
-        for i, m in enumerate(max_length):
-            if type(m) is int:
-                types[i] += '(' + str(m) + ')'
-            elif type(m) is list:
-                types[i] += '(' + str(m[0]) + ',' + str(m[1]) + ')'
-
-        template = zip(columns, types)
-
-        with connection.cursor() as cursor:
-            #concatenates an SQL query for table creation
-            init_string = 'CREATE TABLE ' + jobname + ' ('
-            for pair in template[:-1]:
-                init_string += pair[0] + ' ' + pair[1] + ', '
-            init_string += template[-1][0] + ' ' + template[-1][1] + ')'
-            cursor.execute(init_string)
-            # adds rows to the table
-            for line in lines[1:]:
-                if line != '':
-                    cursor.execute(make_insert(line, template, jobname))
\ No newline at end of file
+            cursor.executemany(insert_string, batch)
+        if writer is not None:
+            writer.append(batch)
+        if rollup is not None:
+            rollup.append(columns, batch)
+        count += len(batch)
+    return count
+
+
+def column_values(jobname, name, count):
+    """
+    Reading values of a column of a job table as strings, in the order rows were loaded.
+    :param count: number of values to read from the first row
+    :return: A generator of lists of at most PARSER_BATCH_SIZE values
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT ' + quote(name) + ' FROM ' + quote(jobname) + ' ORDER BY row_id LIMIT %s', [count])
+        batch = cursor.fetchmany(PARSER_BATCH_SIZE)
+        while batch:
+            yield [value.encode('utf-8') if isinstance(value, unicode) else str(value) for value, in batch]
+            batch = cursor.fetchmany(PARSER_BATCH_SIZE)
+
+
+def dump_columns(columns):
+    """ Serializing table columns to be stored between incremental loads."""
+    return json.dumps([[c.name, c.type, c.length, c.digits, c.scale] for c in columns])
+
+
+def load_columns(text):
+    """ Restoring columns serialized with dump_columns, None for an empty string."""
+    if not text:
+        return None
+    columns = []
+    for name, type, length, digits, scale in json.loads(text):
+        column = Column(name, type)
+        column.length = length
+        column.digits = digits
+        column.scale = scale
+        column.declared = column.declaration()
+        columns.append(column)
+    return columns
+
+
+def parse(filename, jobname, offset=0, columns=None, final=True, cache_dir=None, rollup=None, procs=None):
+    """
+    Loading an out file into a table named after the job, compressed files are decompressed while they are read.
+    The file is read line by line, column types are inferred from PARSER_SAMPLE_SIZE
+    lines spread over the file (the first ones if it is still being written)
+    and widened later if some value does not fit, so memory usage does not depend on the file size.
+    A file which is still being written can be loaded in several calls, each one
+    appending the lines written since the previous call.
+    Every call is done in a single transaction.
+    :param filename: path to the out file
+    :param jobname: name of the table
+    :param offset: position in the file where the previous call stopped
+    :param columns: columns of the table created by the previous call, None to create a new table
+    :param final: False if the file is still being written
+    :param cache_dir: directory to also store rows in as columnar files (see logs.columnar), if any
+    :param rollup: logs.rollup.Rollup to accumulate per-parameter statistics of the rows in, if any
+    :param procs: logs.procs.ProcTagger to tag rows of a new table with ProcId by, if any
+    :return: A tuple (number of loaded rows, offset after the last loaded line, table columns)
+    """
+    with open_out(filename) as file:
+        file.seek(offset)
+        if columns is None:
+            header = file.readline()
+            if not final and not header.endswith('\n'):
+                return 0, offset, None
+            names = read_header(header)
+        reader = LineReader(file, final)
+        lines = iter(reader)
+
+        writer = None
+        with transaction.atomic(), connection.cursor() as cursor:
+            append = columns is not None
+            if columns is None:
+                if final:
+                    sample = sample_lines(file, reader.offset, out_size(filename), PARSER_SAMPLE_SIZE)
+                    file.seek(reader.offset)
+                else:
+                    sample = list(islice(lines, PARSER_SAMPLE_SIZE))
+                    lines = chain(sample, lines)
+                if len(sample) == 0:
+                    return 0, offset, None
+                columns = infer_columns(names, sample)
+                if procs is not None:
+                    columns.append(Column(PROC_ID_COLUMN))
+                create_table(cursor, jobname, columns)
+            tag = None
+            if columns[-1].name == PROC_ID_COLUMN:
+                tag = procs.bind(columns[:-1]) if procs is not None else lambda values: '-1'
+            if cache_dir is not None:
+                writer = ColumnarWriter(cache_dir, columns, partial(column_values, jobname), append)
+            # adds rows to the table, widening columns which are too narrow for the rest of the file
+            rows = insert_rows(cursor, jobname, columns, fit_rows(cursor, jobname, columns, lines, tag),
+                               writer, rollup)
+        if writer is not None:
+            writer.close()
+        return rows, reader.offset, columns
+
+
+def stage_name(jobname, proc_id):
+    """ Name of the table rows of a per-proc out file are loaded into before they are merged into the job table."""
+    return jobname + '__proc_' + str(proc_id)
+
+
+def fragment_directory(cache_dir, proc_id):
+    """ Directory of the columnar cache rows of a per-proc out file are stored in before they are merged."""
+    return os.path.join(cache_dir, 'proc.{0}'.format(proc_id))
+
+
+# Database connections a worker process inherited from its parent, see forget_connections
+inherited_connections = []
+
+
+def forget_connections():
+    """
+    Making a forked worker process open database connections of its own. The inherited ones are used by
+    the parent, which may be in a transaction, so they are kept referenced and are never closed by the worker.
+    """
+    for wrapper in connections.all():
+        if wrapper.connection is not None:
+            inherited_connections.append(wrapper.connection)
+            wrapper.connection = None
+
+
+def stage_proc_output(task):
+    """
+    Loading lines of a per-proc out file written since the previous load into a staging table of TEXT columns
+    (see stage_name) by batches of PARSER_BATCH_SIZE lines, every row tagged with the ProcId of the file.
+    Columns are fitted to the lines meanwhile, and the rows are also stored in a columnar cache of their own
+    (see fragment_directory) and in per-parameter statistics if requested, so that the process merging them
+    (see parse_procs) reads and splits no line. Runs in a worker process with its own database connection,
+    or in the merging process on SQLite, which allows only one writer at a time.
+    :param task: a tuple (path to the file, offset to start at, column names or None to read them from the header,
+                 final, name of the job table, ProcId, cache directory or None, sweep parameter names or None)
+    :return: A tuple (column names or None, fitted columns with the ProcId one, number of loaded rows,
+             offset after the last loaded line, statistics of a logs.rollup.Rollup or None),
+             names are None and the offset is not moved if the header has not been written completely yet
+    """
+    # imported here, since logs.rollup imports this module
+    from rollup import Rollup
+    filename, offset, names, final, jobname, proc_id, cache_dir, parameters = task
+    table = stage_name(jobname, proc_id)
+    writer = None
+    rollup = Rollup(jobname, parameters, stored=False) if parameters is not None else None
+    with open_out(filename) as file:
+        file.seek(offset)
+        if offset == 0:
+            header = file.readline()
+            if not final and not header.endswith('\n'):
+                return None, [], 0, offset, None
+            names = read_header(header)
+        reader = LineReader(file, final)
+        columns = [Column(name) for name in names] + [Column(PROC_ID_COLUMN)]
+        tag = [str(proc_id)]
+        count = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS ' + quote(table))
+            for batch in batches(reader, PARSER_BATCH_SIZE):
+                rows = [line.split()[:len(names)] + tag for line in batch]
+                if count == 0:
+                    cursor.execute('CREATE TABLE ' + quote(table) + ' (row_id ' + ROW_ID_DECLARATIONS[connection.vendor] +
+                                   ', ' + ', '.join(quote(c.name) + ' TEXT' for c in columns) + ')')
+                    if cache_dir is not None:
+                        writer = ColumnarWriter(fragment_directory(cache_dir, proc_id), columns,
+                                                partial(column_values, table), False)
+                fit_columns(columns, rows)
+                count += insert_rows(cursor, table, columns, rows, writer, rollup)
+    if writer is not None:
+        writer.close()
+    return names, columns, count, reader.offset, rollup.stats if rollup is not None else None
+
+
+def merge_staged(cursor, jobname, columns, proc_id):
+    """ Copying rows of a staging table (see stage_proc_output) into the job table in the order they were loaded."""
+    names = ', '.join(quote(c.name) for c in columns)
+    values = names
+    if connection.vendor == 'postgresql':
+        # other databases convert values by the declared types themselves
+        values = ', '.join('CAST(' + quote(c.name) + ' AS ' + c.declaration() + ')' for c in columns)
+    cursor.execute('INSERT INTO ' + quote(jobname) + ' (' + names + ') SELECT ' + values +
+                   ' FROM ' + quote(stage_name(jobname, proc_id)) + ' ORDER BY row_id')
+
+
+def parse_procs(files, jobname, offsets, columns=None, final=True, cache_dir=None, rollup=None, workers=1):
+    """
+    Loading per-proc out files (out.<ProcId>) into a table named after the job, every row tagged with
+    the ProcId of its file. Up to workers processes read, split, fit and load the new lines of the files
+    into staging tables at once (see stage_proc_output), while the main process merges fitted columns into
+    the table columns, widens the table and copies every staging table into it with one INSERT ... SELECT,
+    so it reads no line and no process holds more than a batch of lines.
+    The main process works in a single transaction. Like parse, it can be called again while the files grow.
+    :param files: a list of pairs (ProcId, path to the file)
+    :param offsets: a dictionary ProcId string -> position in the file where the previous call stopped
+    :param columns: columns of the table created by the previous call, None to create a new table
+    :return: A tuple (number of loaded rows, updated offsets, table columns)
+    """
+    offsets = dict(offsets)
+    tasks = [(proc_id, filename, offsets.get(str(proc_id), 0)) for proc_id, filename in files
+             if out_size(filename) > offsets.get(str(proc_id), 0)]
+    names = [c.name for c in columns[:-1]] if columns is not None else None
+    parameters = rollup.parameters if rollup is not None else None
+    # SQLite allows one writer at a time, and worker processes can not start processes of their own
+    pool = None
+    if workers > 1 and len(tasks) > 1 and connection.vendor != 'sqlite' and not current_process().daemon:
+        pool = Pool(workers, forget_connections)
+    stage = pool.imap if pool is not None else imap
+    rows = 0
+    append = columns is not None
+    writer = None
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            results = stage(stage_proc_output, [(filename, start, names, final, jobname, proc_id, cache_dir, parameters)
+                                                for proc_id, filename, start in tasks])
+            for (proc_id, filename, start), (file_names, fits, count, end, stats) in zip(tasks, results):
+                if file_names is None and start == 0:
+                    continue    # the header is still being written
+                if columns is None and count == 0:
+                    continue
+                if columns is not None and file_names[:len(columns) - 1] != [c.name for c in columns[:-1]]:
+                    raise SyntaxError('Columns of {0} differ from the other outputs'.format(filename))
+                if columns is None:
+                    columns = fits
+                    create_table(cursor, jobname, columns)
+                else:
+                    fitted = dict((fit.name, fit) for fit in fits)
+                    for column in columns:
+                        if column.merge(fitted[column.name]):
+                            widen_column(cursor, jobname, columns, column)
+                if writer is None and cache_dir is not None:
+                    writer = ColumnarWriter(cache_dir, columns, partial(column_values, jobname), append)
+                if count > 0:
+                    merge_staged(cursor, jobname, columns, proc_id)
+                    if writer is not None:
+                        fragment = fragment_directory(cache_dir, proc_id)
+                        writer.append_cache(fragment, partial(column_values, stage_name(jobname, proc_id)))
+                        shutil.rmtree(fragment)
+                    if rollup is not None:
+                        rollup.extend(stats)
+                    cursor.execute('DROP TABLE ' + quote(stage_name(jobname, proc_id)))
+                    rows += count
+                offsets[str(proc_id)] = end
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if writer is not None:
+        writer.close()
+    return rows, offsets, columns
@@ -0,0 +1,138 @@
+import numpy
+from django.db import connection
+
+from models import JobIngest
+from parser import load_columns, quote
+from columnar import cache_directory, read_columns, sort_index
+
+# Range of plot widths in pixels a series can be downsampled to
+MIN_WIDTH = 10
+MAX_WIDTH = 10000
+
+# Number of points fetched from the database at once
+FETCH_SIZE = 10000
+
+
+def lttb(x, y, threshold):
+    """
+    Downsampling a series sorted by x with the Largest-Triangle-Three-Buckets algorithm.
+    Points of every bucket are compared at once, only the loop over buckets is done in Python.
+    :param x: NumPy array of x values in ascending order
+    :param y: NumPy array of y values
+    :param threshold: number of points to keep
+    :return: A pair of NumPy arrays (x, y)
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    # the first and the last points are always kept, others are split into threshold - 2 buckets
+    edges = numpy.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = numpy.zeros(threshold, int)
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[n - 1]
+        next_y = y[end:next_end].mean() if next_end > end else y[n - 1]
+        areas = numpy.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+def minmax(x, y, buckets):
+    """
+    Downsampling a series sorted by x by keeping the lowest and the highest point of every bucket.
+    :param buckets: number of buckets of equal number of points
+    :return: A pair of NumPy arrays (x, y) with up to 2 * buckets points
+    """
+    n = len(x)
+    if 2 * buckets >= n or buckets < 1:
+        return x, y
+    size = -(-n // buckets)
+    padded = numpy.full(size * buckets, numpy.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    starts = numpy.arange(buckets) * size
+    filled = starts < n
+    lows = starts + numpy.where(numpy.isnan(padded), numpy.inf, padded).argmin(axis=1)
+    highs = starts + numpy.where(numpy.isnan(padded), -numpy.inf, padded).argmax(axis=1)
+    selected = numpy.unique(numpy.concatenate((lows[filled], highs[filled])))
+    return x[selected], y[selected]
+
+
+METHODS = {
+    'lttb': lambda x, y, width: lttb(x, y, width),
+    'minmax': lambda x, y, width: minmax(x, y, max(width // 2, 1)),
+}
+
+
+def visible_series(job_name, x_name, y_name, xmin, xmax):
+    """
+    Reading points with x in [xmin, xmax] in ascending x order.
+    The columnar cache is used when x has been sorted in it (see logs.columnar.build_sort_indexes),
+    only the visible rows of y are read from it; otherwise the job table is queried with the range
+    pushed down to the database, and the points are fetched by batches of FETCH_SIZE into arrays.
+    :return: A pair of NumPy float64 arrays (x, y)
+    :raise ValueError: if a column is unknown or is not numeric
+    """
+    directory = cache_directory(job_name)
+    columns = read_columns(directory)
+    if columns is not None and x_name in columns and y_name in columns:
+        if not isinstance(columns[y_name], numpy.ndarray):
+            raise ValueError('Not a numeric column: ' + y_name)
+        index = sort_index(directory, x_name)
+        if index is not None:
+            values, order = index
+            start = numpy.searchsorted(values, xmin, 'left') if xmin is not None else 0
+            end = numpy.searchsorted(values, xmax, 'right') if xmax is not None else len(values)
+            rows = order[start:end]
+            return numpy.array(values[start:end]), numpy.asarray(columns[y_name][rows], float)
+
+    ingest = JobIngest.objects.filter(job_name=job_name).first()
+    table_columns = load_columns(ingest.columns) if ingest is not None else None
+    types = dict((c.name, c.type) for c in table_columns or [])
+    for name in (x_name, y_name):
+        if types.get(name) not in ('INTEGER', 'DECIMAL', 'FLOAT'):
+            raise ValueError('Not a numeric column: ' + name)
+    query = 'SELECT ' + quote(x_name) + ', ' + quote(y_name) + ' FROM ' + quote(job_name)
+    conditions = []
+    params = []
+    if xmin is not None:
+        conditions.append(quote(x_name) + ' >= %s')
+        params.append(xmin)
+    if xmax is not None:
+        conditions.append(quote(x_name) + ' <= %s')
+        params.append(xmax)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY ' + quote(x_name) + ', row_id'
+    chunks = [numpy.zeros((0, 2))]
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        batch = cursor.fetchmany(FETCH_SIZE)
+        while batch:
+            chunks.append(numpy.array(batch, float))
+            batch = cursor.fetchmany(FETCH_SIZE)
+    points = numpy.concatenate(chunks)
+    return points[:, 0], points[:, 1]
+
+
+def plot_series(job_name, x_name, y_name, width, xmin=None, xmax=None, method='lttb'):
+    """
+    Getting a series of a job's results ready to be drawn: points with x in the visible
+    range downsampled on the server to about one or two points per pixel.
+    :param width: plot width in pixels, from MIN_WIDTH to MAX_WIDTH
+    :param method: 'lttb' or 'minmax'
+    :return: A dictionary {'x': list, 'y': list, 'total': number of points in the visible range}
+    :raise ValueError: on unknown columns or method, or a width out of range
+    """
+    if method not in METHODS:
+        raise ValueError('Unknown method: ' + method)
+    if not MIN_WIDTH <= width <= MAX_WIDTH:
+        raise ValueError('Width must be from {0} to {1}'.format(MIN_WIDTH, MAX_WIDTH))
+    x, y = visible_series(job_name, x_name, y_name, xmin, xmax)
+    total = len(x)
+    x, y = METHODS[method](x, y, width)
+    return {'x': x.tolist(), 'y': y.tolist(), 'total': total}
@@ -0,0 +1,35 @@
+from sim.models import ProcParameter
+
+
+class ProcTagger:
+    """
+    Finding which proc of a cluster produced a result row, by the values of the sweep
+    parameters in the row, as recorded at submission (see sim.models.ProcParameter).
+    Values are compared as strings, rows which match no proc get ProcId -1.
+    """
+    def __init__(self, cluster_id):
+        self.procs = {}
+        for proc_id, name, value in ProcParameter.objects.filter(cluster_id=cluster_id)\
+                .values_list('proc_id', 'name', 'value'):
+            self.procs.setdefault(proc_id, {})[name] = value
+
+    def bind(self, columns):
+        """
+        :param columns: columns of an out file, without the ProcId column
+        :return: A function getting a ProcId string by values of a line
+        """
+        names = [c.name for c in columns]
+        parameters = set()
+        for values in self.procs.values():
+            parameters.update(name for name in values if name in names)
+        indices = [names.index(name) for name in sorted(parameters)]
+        lookup = {}
+        for proc_id, values in sorted(self.procs.items(), reverse=True):
+            lookup[tuple(values.get(names[i]) for i in indices)] = str(proc_id)
+        return lambda values: lookup.get(tuple(values[i] for i in indices), '-1')
+
+
+def proc_ids(cluster_id, name, value):
+    """ ProcIds of a cluster submitted with a value of a parameter, with an index lookup."""
+    return list(ProcParameter.objects.filter(cluster_id=cluster_id, name=name, value=value)
+                .order_by('proc_id').values_list('proc_id', flat=True))
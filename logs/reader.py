@@ -0,0 +1,285 @@
+import os
+import mmap
+import zlib
+
+import numpy
+
+# Number of bytes scanned for line breaks at once while building an index
+INDEX_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+class OutFile:
+    """
+    Random access to data lines of an out file through mmap and a line-offset index.
+    The index holds start and end offsets of every non-empty data line and is stored
+    next to the file (out.idx) by index_out_file, which only scans lines appended since it was built.
+    Reading never scans the file: lines the stored index does not cover yet are not visible.
+    Lines are copied into Python strings only when they are requested.
+    """
+    def __init__(self, filename):
+        """
+        :param filename: path to the out file
+        """
+        self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.file = open(filename, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size > 0:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.map = ''
+        self.header_end = self.map.find('\n') + 1
+        self.header = self.map[:self.header_end]
+        self.covered, self.lines = self.load_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.size > 0:
+            self.map.close()
+        self.file.close()
+
+    def load_index(self):
+        """
+        :return: A pair (offset the index covers the file up to, array of (start, end) line offsets)
+        """
+        try:
+            index = numpy.fromfile(self.index_filename, '<i8')
+        except IOError:
+            index = numpy.zeros(0, '<i8')
+        if len(index) == 0 or index[0] > self.size:
+            return self.header_end, numpy.zeros((0, 2), '<i8')
+        return int(index[0]), index[1:].reshape(-1, 2)
+
+    def update_index(self, final):
+        """
+        Indexing lines appended since the stored index was built, and storing the result.
+        :param final: False if the file is still being written, then a trailing line
+                      without a line break is not indexed
+        """
+        covered, lines = self.covered, self.lines
+        if self.header_end == 0 or covered >= self.size:
+            return
+        starts = []
+        ends = []
+        position = covered
+        for offset in range(covered, self.size, INDEX_CHUNK_SIZE):
+            count = min(INDEX_CHUNK_SIZE, self.size - offset)
+            breaks = numpy.flatnonzero(numpy.frombuffer(self.map, 'u1', count, offset) == ord('\n')) + offset
+            if len(breaks) == 0:
+                continue
+            starts.append(numpy.concatenate(([position], breaks[:-1] + 1)))
+            ends.append(breaks)
+            position = int(breaks[-1]) + 1
+        if final and position < self.size:
+            starts.append(numpy.array([position]))
+            ends.append(numpy.array([self.size]))
+            position = self.size
+        if len(starts) == 0:
+            return
+        new_lines = numpy.column_stack((numpy.concatenate(starts), numpy.concatenate(ends))).astype('<i8')
+        lines = numpy.concatenate((lines, new_lines[new_lines[:, 1] > new_lines[:, 0]]))
+        index = numpy.concatenate(([position], lines.ravel())).astype('<i8')
+        index.tofile(self.index_filename + '.tmp')
+        os.rename(self.index_filename + '.tmp', self.index_filename)
+        self.covered, self.lines = position, lines
+
+    def __len__(self):
+        return len(self.lines)
+
+    def rows(self, start, stop):
+        """ Data lines with numbers from start to stop, without line breaks."""
+        return [self.map[begin:end] for begin, end in self.lines[start:stop]]
+
+
+def compressed_paths(filename):
+    """ Paths of the compressed copy of an out file and of the index of its blocks, see logs.archive."""
+    return filename + '.gz', filename + '.gz.idx'
+
+
+class BlockReader:
+    """
+    Reading an out file compressed by logs.archive.compress as if it was a plain file opened for reading.
+    Every block of the file is a separate gzip member, and the stored index tells where blocks start
+    in both files, so seek decompresses only the block it lands in, and reading goes on block by block.
+    """
+    def __init__(self, filename):
+        """
+        :param filename: path to the out file before it was compressed
+        :raise IOError: if there is no compressed copy of the file
+        """
+        path, index_path = compressed_paths(filename)
+        self.file = open(path, 'rb')
+        # rows (compressed offset, uncompressed offset, data lines before) of every block and of the end
+        self.index = numpy.fromfile(index_path, '<i8').reshape(-1, 3)
+        self.size = int(self.index[-1][1])
+        self.block = -1
+        self.start = 0
+        self.data = ''
+        self.position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def load(self, block):
+        if block != self.block:
+            begin, end = int(self.index[block][0]), int(self.index[block + 1][0])
+            self.file.seek(begin)
+            self.data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(self.file.read(end - begin))
+            self.block = block
+            self.start = int(self.index[block][1])
+        self.position = 0
+
+    def seek(self, offset):
+        block = max(int(numpy.searchsorted(self.index[:-1, 1], offset, 'right')) - 1, 0)
+        self.load(block)
+        self.position = offset - self.start
+
+    def tell(self):
+        return self.start + self.position
+
+    def readline(self):
+        parts = []
+        while True:
+            if self.position >= len(self.data):
+                if self.block + 1 >= len(self.index) - 1:
+                    break
+                self.load(self.block + 1)
+            end = self.data.find('\n', self.position)
+            if end < 0:
+                parts.append(self.data[self.position:])
+                self.position = len(self.data)
+                continue
+            parts.append(self.data[self.position:end + 1])
+            self.position = end + 1
+            break
+        return ''.join(parts)
+
+
+class BlockOutFile:
+    """ Data lines of a compressed out file, with the interface of OutFile."""
+    def __init__(self, filename):
+        self.reader = BlockReader(filename)
+        self.header = self.reader.readline()
+        self.lines = int(self.reader.index[-1][2])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.reader.close()
+
+    def __len__(self):
+        return self.lines
+
+    def block_rows(self, block, start, count):
+        """ Up to count data lines starting with the data line number start of a block, without line breaks."""
+        self.reader.seek(int(self.reader.index[block][1]))
+        if block == 0:
+            self.reader.readline()
+        skip = start - int(self.reader.index[block][2])
+        rows = []
+        for line in iter(self.reader.readline, ''):
+            line = line.rstrip('\n')
+            if line == '':
+                continue
+            if skip > 0:
+                skip -= 1
+                continue
+            if len(rows) == count:
+                break
+            rows.append(line)
+        return rows
+
+    def rows(self, start, stop):
+        """ Data lines with numbers from start to stop, without line breaks."""
+        stop = min(stop, self.lines)
+        if start >= stop:
+            return []
+        block = int(numpy.searchsorted(self.reader.index[:-1, 2], start, 'right')) - 1
+        return self.block_rows(block, start, stop - start)
+
+
+def open_out(filename):
+    """
+    Opening an out file for reading lines, whether it is a plain file or has been compressed.
+    :return: A file object, or a BlockReader for a compressed file
+    :raise IOError: if there is neither
+    """
+    try:
+        return open(filename, 'r')
+    except IOError:
+        if not os.path.exists(compressed_paths(filename)[0]):
+            raise
+    return BlockReader(filename)
+
+
+def sample_lines(file, start, end, size):
+    """
+    Reading up to size data lines spread evenly over an opened out file without indexing it:
+    the file is sought to evenly spaced offsets and the first whole line after each one is read,
+    so only the sampled lines are read however large the file is.
+    :param file: a file opened for reading, or a BlockReader
+    :param start: offset of the first data line
+    :param end: size of the file
+    :return: A list of data lines without line breaks, all of them if there are less than size
+    """
+    sample = []
+    position = start
+    for i in range(size):
+        offset = start + (end - start) * i // size
+        if offset > position:
+            # the line break before offset is read, so a line starting at offset is kept whole
+            file.seek(offset - 1)
+            file.readline()
+        else:
+            file.seek(position)
+        for line in iter(file.readline, ''):
+            if line.strip() != '':
+                sample.append(line.rstrip('\n'))
+                break
+        position = file.tell()
+        if position >= end:
+            break
+    return sample
+
+
+def index_out_file(filename, final=True):
+    """ Extending the stored line index of a plain out file to the lines written since it was built, see OutFile."""
+    with OutFile(filename) as out:
+        out.update_index(final)
+
+
+def open_out_file(filename):
+    """
+    Getting random access to data lines of a plain or compressed out file, see OutFile.
+    A plain file is read through its stored index, built by index_out_file.
+    """
+    if os.path.exists(filename) or not os.path.exists(compressed_paths(filename)[0]):
+        return OutFile(filename)
+    return BlockOutFile(filename)
+
+
+def out_exists(filename):
+    return os.path.exists(filename) or os.path.exists(compressed_paths(filename)[0])
+
+
+def out_size(filename):
+    """ Size of an out file, of its uncompressed content for a compressed one."""
+    if os.path.exists(filename):
+        return os.path.getsize(filename)
+    with BlockReader(filename) as reader:
+        return reader.size
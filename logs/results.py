@@ -0,0 +1,129 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import connection
+
+from models import JobIngest
+from outputs import proc_out_files
+from parser import PROC_ID_COLUMN, load_columns, read_header, quote
+from reader import open_out_file
+from sporeweb.settings import WORKING_DIRECTORY, LOGS_PAGE_SIZE, LOGS_PAGE_CACHE_TIMEOUT
+
+
+def check_columns(table_columns, names):
+    """
+    Checking requested column names against columns of a job table.
+    :param table_columns: a list of logs.parser.Column
+    :param names: requested names, None or an empty list for all columns
+    :return: Requested names, or names of all columns
+    :raise ValueError: if some name is not a column of the table
+    """
+    known = [c.name for c in table_columns]
+    for name in names or []:
+        if name not in known:
+            raise ValueError('Unknown column: ' + name)
+    return names if names else known
+
+
+def table_page(job_name, names, sort, descending, after, after_id, size):
+    """
+    Reading a page of a job table with keyset pagination, i.e. rows following the row
+    (after, after_id) in (sort, row_id) order, so that any page costs an index range scan.
+    :param names: columns to select
+    :param sort: column to sort by, None to keep the loading order
+    :return: A dictionary {'columns', 'rows', 'after', 'after_id'}, the last two are None on the last page
+    """
+    select = ['row_id'] + ([sort] if sort is not None else []) + names
+    query = 'SELECT ' + ', '.join(quote(name) for name in select) + ' FROM ' + quote(job_name)
+    params = []
+    op = '<' if descending else '>'
+    order = ' DESC' if descending else ''
+    if sort is None:
+        if after_id is not None:
+            query += ' WHERE row_id ' + op + ' %s'
+            params = [after_id]
+        query += ' ORDER BY row_id' + order
+    else:
+        if after_id is not None:
+            query += ' WHERE ' + quote(sort) + ' ' + op + ' %s OR (' + quote(sort) + ' = %s AND row_id ' + op + ' %s)'
+            params = [after, after, after_id]
+        query += ' ORDER BY ' + quote(sort) + order + ', row_id' + order
+    query += ' LIMIT %s'
+    params.append(size + 1)
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    page = {'columns': names, 'rows': [list(row[len(select) - len(names):]) for row in rows[:size]],
+            'after': None, 'after_id': None}
+    if len(rows) > size:
+        last = rows[size - 1]
+        page['after_id'] = last[0]
+        if sort is not None:
+            # repr keeps all digits of a float, so that the next page starts exactly after it
+            page['after'] = repr(last[1]) if isinstance(last[1], float) else last[1]
+    return page
+
+
+def out_file_page(job_name, after_id, size):
+    """
+    Reading a page of results straight from the out files of a job which has not been loaded yet,
+    through the line indexes the ingest daemon stores for them (see logs.daemon.index_out_files).
+    Per-proc files are read one after another in the order of procs, with the proc of each row in
+    an extra column, like they are loaded (see logs.parser.parse_procs).
+    """
+    start = int(after_id) if after_id is not None else 0
+    files = proc_out_files(job_name) or [(None, WORKING_DIRECTORY + '/{0}/out'.format(job_name))]
+    names = []
+    rows = []
+    skip = start
+    more = False
+    for proc_id, filename in files:
+        try:
+            out = open_out_file(filename)
+        except IOError:
+            continue
+        with out:
+            if not names and out.header:
+                names = read_header(out.header) + ([PROC_ID_COLUMN] if proc_id is not None else [])
+            if len(rows) == size:
+                more = len(out) > 0
+            else:
+                lines = out.rows(skip, skip + size - len(rows))
+                rows.extend(line.split() + ([str(proc_id)] if proc_id is not None else []) for line in lines)
+                more = len(out) > skip + len(lines)
+                skip = max(skip - len(out), 0)
+        if more:
+            break
+    return {'columns': names, 'rows': rows, 'after': None, 'after_id': start + size if more else None}
+
+
+def get_page(job_name, columns=None, sort=None, after=None, after_id=None, size=LOGS_PAGE_SIZE):
+    """
+    Getting a page of results of a job, cached until the job is loaded again.
+    Results which are not in the database yet are read from the out file, unsorted.
+    :param columns: names of columns to show, all of them by default
+    :param sort: a column name to sort by, prefixed with '-' for descending order
+    :param after: value of the sort column in the last row of the previous page
+    :param after_id: row_id of the last row of the previous page
+    :return: A dictionary {'columns', 'rows', 'after', 'after_id'}
+    :raise ValueError: if an unknown column is requested
+    """
+    ingest = JobIngest.objects.filter(job_name=job_name).first()
+    table_columns = load_columns(ingest.columns) if ingest is not None else None
+    if table_columns is None:
+        return out_file_page(job_name, after_id, size)
+
+    descending = sort is not None and sort.startswith('-')
+    if sort is not None:
+        sort = sort.lstrip('-')
+        check_columns(table_columns, [sort])
+    names = check_columns(table_columns, columns)
+
+    key = 'logs:page:' + hashlib.md5(repr((job_name, ingest.version, names, sort, descending,
+                                            after, after_id, size))).hexdigest()
+    page = cache.get(key)
+    if page is None:
+        page = table_page(job_name, names, sort, descending, after, after_id, size)
+        cache.set(key, page, LOGS_PAGE_CACHE_TIMEOUT)
+    return page
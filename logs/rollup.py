@@ -0,0 +1,94 @@
+from collections import OrderedDict
+
+import numpy
+
+from models import ResultSummary
+from parser import PROC_ID_COLUMN
+
+
+def merge(a, b):
+    """
+    Merging statistics of two sets of values, each one a list [count, mean, m2, minimum, maximum]
+    where m2 is the sum of squared deviations from the mean (Chan et al. parallel algorithm).
+    """
+    count = a[0] + b[0]
+    delta = b[1] - a[1]
+    mean = a[1] + delta * b[0] / count
+    m2 = a[2] + b[2] + delta * delta * a[0] * b[0] / count
+    return [count, mean, m2, min(a[3], b[3]), max(a[4], b[4])]
+
+
+class Rollup:
+    """
+    Per-parameter statistics of numeric result columns, accumulated batch by batch while
+    a job is loaded, so that analysis never has to group the whole job table.
+    Rows are grouped by every value of every sweep parameter found among the columns,
+    and also all together under an empty parameter name.
+    """
+    def __init__(self, job_name, parameters=(), stored=True):
+        """
+        :param job_name: name of the job, statistics stored by a previous load are continued
+        :param parameters: names of the sweep parameters (see sim.spec_factory.SpecFactory)
+        :param stored: False to start from no statistics, e.g. for a part of a load merged later by extend
+        """
+        self.job_name = job_name
+        self.parameters = list(parameters)
+        self.stats = OrderedDict()
+        if not stored:
+            return
+        for summary in ResultSummary.objects.filter(job_name=job_name):
+            self.stats[(summary.parameter, summary.value, summary.column)] = \
+                [summary.count, summary.mean, summary.m2, summary.minimum, summary.maximum]
+
+    def append(self, columns, rows):
+        """ Adding a batch of rows, each one a list of string values fitting columns."""
+        if len(rows) == 0:
+            return
+        names = [c.name for c in columns]
+        groups = [('', None)] + [(p, names.index(p)) for p in self.parameters if p in names]
+        numeric = [i for i, c in enumerate(columns)
+                   if c.type != 'VARCHAR' and c.name not in self.parameters and c.name != PROC_ID_COLUMN]
+        values = numpy.array([[row[i] for i in numeric] for row in rows], float).reshape(len(rows), len(numeric))
+        for parameter, index in groups:
+            keys = [row[index] for row in rows] if index is not None else [''] * len(rows)
+            keys, inverse = numpy.unique(keys, return_inverse=True)
+            counts = numpy.bincount(inverse)
+            for j, i in enumerate(numeric):
+                column = values[:, j]
+                means = numpy.bincount(inverse, column) / counts
+                m2 = numpy.bincount(inverse, (column - means[inverse]) ** 2)
+                minimums = numpy.full(len(keys), numpy.inf)
+                numpy.minimum.at(minimums, inverse, column)
+                maximums = numpy.full(len(keys), -numpy.inf)
+                numpy.maximum.at(maximums, inverse, column)
+                for k, key in enumerate(keys):
+                    batch = [int(counts[k]), float(means[k]), float(m2[k]), float(minimums[k]), float(maximums[k])]
+                    stat = (parameter, str(key), names[i])
+                    self.stats[stat] = merge(self.stats[stat], batch) if stat in self.stats else batch
+
+    def extend(self, stats):
+        """ Adding statistics accumulated separately, e.g. by another process, see Rollup.stats."""
+        for stat, batch in stats.items():
+            self.stats[stat] = merge(self.stats[stat], batch) if stat in self.stats else batch
+
+    def save(self, columns):
+        """ Replacing stored statistics of the job, columns which became VARCHAR are dropped."""
+        numeric = set(c.name for c in columns if c.type != 'VARCHAR')
+        ResultSummary.objects.filter(job_name=self.job_name).delete()
+        ResultSummary.objects.bulk_create([
+            ResultSummary(job_name=self.job_name, parameter=parameter, value=value, column=column,
+                          count=stat[0], mean=stat[1], m2=stat[2], minimum=stat[3], maximum=stat[4])
+            for (parameter, value, column), stat in self.stats.items() if column in numeric
+        ])
+
+
+def job_summary(job_name, parameter=''):
+    """
+    Getting stored statistics of a job's results.
+    :param parameter: name of a sweep parameter to group by, an empty string for all rows together
+    :return: A list of dictionaries {'value', 'column', 'count', 'mean', 'stddev', 'min', 'max'}
+    """
+    return [{'value': s.value, 'column': s.column, 'count': s.count, 'mean': s.mean,
+             'stddev': s.stddev, 'min': s.minimum, 'max': s.maximum}
+            for s in ResultSummary.objects.filter(job_name=job_name, parameter=parameter)
+            .order_by('column', 'value')]
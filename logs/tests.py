@@ -1,20 +1,36 @@
+import gzip
+import json
+import zlib
 import os
+import shutil
+import numpy
 from decimal import Decimal
 from time import sleep
 
-from htcondor import Schedd
-from classad import ClassAd
+from htcondor import Schedd, JobEventType
+from classad import ClassAd, ExprTree
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.test import TestCase
+from django.core.cache import cache
 from django.db import connection
 from django.urls import reverse
 
-from sim.models import JobIdModel
-from .models import FinishedJobs
-from .parser import parse, check_type, make_insert
-from .daemon import check_history
-from sporeweb.settings import WORKING_DIRECTORY
+from sim.models import Job, ProcParameter, SubmittedCluster
+from .models import JobIngest, HistoryCheckpoint, ResultSummary
+from . import parser
+from .parser import parse, check_type, insert_statement, quote, batches, load_columns, dump_columns, Column
+from .columnar import read_columns
+from .reader import OutFile, BlockReader, open_out_file, index_out_file, out_exists, out_size, sample_lines
+from .results import get_page
+from .plots import lttb, minmax, plot_series
+from .rollup import merge, job_summary
+from .procs import proc_ids
+from .outputs import proc_out_files
+from .archive import compress
+from .daemon import load_out_file, check_history, ingest_jobs, ingest_running_jobs, history_constraint, check_events, \
+    resume_ingest
+from sporeweb.settings import WORKING_DIRECTORY, HISTORY_CHECK_WINDOW
 
 class CheckTypeTest(TestCase):
     def test_with_integer(self):
@@ -42,17 +58,32 @@ class CheckTypeTest(TestCase):
         res = check_type(str)
         self.assertEqual(res, 'VARCHAR')
 
+    def test_with_negative_numbers(self):
+        self.assertEqual(check_type('-160'), 'INTEGER')
+        self.assertEqual(check_type('-16.0'), 'DECIMAL')
+        self.assertEqual(check_type('-1.5e-3'), 'FLOAT')
+        self.assertEqual(check_type('1-2'), 'VARCHAR')
 
-class MakeInsertTest(TestCase):
-    def test_with_string(self):
+
+class QueryTest(TestCase):
+    def test_insert_statement(self):
+        columns = [Column('spec', 'VARCHAR'), Column('order'), Column('fer', 'FLOAT')]
+        statement = insert_statement('test', columns)
+        self.assertEqual(statement, 'INSERT INTO "test" ("spec", "order", "fer") VALUES (%s, %s, %s)')
+        self.assertEqual(quote('a"b'), '"a""b"')
+
+    def test_names_and_values_are_not_sql(self):
+        filename = '{0}/test_quoted'.format(WORKING_DIRECTORY)
+        file = open(filename, mode='w')
+        file.write('#[spec][order][a"b]\n')
+        file.write("it's 1 2\n")
+        file.write('"x" 2 3\n')
+        file.close()
+        parse(filename, 'test_quoted')
         with connection.cursor() as cursor:
-            template = [('spec', 'VARCHAR(25)'), ('snr', 'DECIMAL(1,2)'), ('schedule', 'INTEGER'), ('fer', 'FLOAT')]
-            jobname = 'test'
-            str = 'R_0.17_N_1024_K_171.xpec 0.25 2 1.31062e-001'
-            res = make_insert(str, template, jobname)
-            expected_res = "INSERT INTO test(spec, snr, schedule, fer) " \
-                           "VALUES ('R_0.17_N_1024_K_171.xpec', 0.25, 2, 1.31062e-001)"
-            self.assertEqual(res, expected_res)
+            cursor.execute('SELECT spec, "order", "a""b" FROM test_quoted ORDER BY row_id')
+            self.assertEqual(cursor.fetchall(), [("it's", 1, 2), ('"x"', 2, 3)])
+        os.remove(filename)
 
 
 class ParserTest(TestCase):
@@ -77,7 +108,236 @@ class ParserTest(TestCase):
             expected_res1 = [(u'R_0.17_N_1024_K_171.xpec', Decimal('0.25'), 3,
                               1024, 171, Decimal('4.17'), 1.73036, 0.131062)]
             self.assertEqual(res1, expected_res1)
+        self.assertFalse(os.path.exists(filename + '.idx'))
+        os.remove(filename)
+
+    def test_with_values_wider_than_sample(self):
+        filename = 'test_logs_parser.txt'
+        jobname = 'test'
+        file = open(filename, mode='w')
+        file.write('#[spec][snr][schedule]\n')
+        file.write('R_0.17 0.5 2\n')
+        file.write('\n')
+        file.write('R_0.17_N_1024_K_171.xpec 120.125 3\n')
+        file.close()
+        sample_size = parser.PARSER_SAMPLE_SIZE
+        parser.PARSER_SAMPLE_SIZE = 1
+        try:
+            parse(filename, jobname)
+        finally:
+            parser.PARSER_SAMPLE_SIZE = sample_size
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT spec, snr, schedule FROM test ORDER BY schedule')
+            res = cursor.fetchall()
+            expected_res = [(u'R_0.17', Decimal('0.5'), 2),
+                            (u'R_0.17_N_1024_K_171.xpec', Decimal('120.125'), 3)]
+            self.assertEqual(res, expected_res)
+        os.remove(filename)
+
+    def test_with_several_batches(self):
+        filename = 'test_logs_parser.txt'
+        jobname = 'test'
+        file = open(filename, mode='w')
+        file.write('#[spec][schedule]\n')
+        for i in range(5):
+            file.write("it's_{0} {0}\n".format(i))
+        file.close()
+        batch_size = parser.PARSER_BATCH_SIZE
+        parser.PARSER_BATCH_SIZE = 2
+        try:
+            parse(filename, jobname)
+        finally:
+            parser.PARSER_BATCH_SIZE = batch_size
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT spec, schedule FROM test ORDER BY schedule')
+            res = cursor.fetchall()
+            self.assertEqual(res, [(u"it's_{0}".format(i), i) for i in range(5)])
+        os.remove(filename)
+
+    def test_with_file_being_written(self):
+        filename = 'test_logs_parser.txt'
+        jobname = 'test'
+        file = open(filename, mode='w')
+        file.write('#[spec][schedule]\nabc 1\ndef 2\ngh')
+        file.close()
+
+        rows, offset, columns = parse(filename, jobname, final=False)
+        self.assertEqual(rows, 2)
+        self.assertEqual(offset, len('#[spec][schedule]\nabc 1\ndef 2\n'))
+        file = open(filename, mode='a')
+        file.write('i 3\n')
+        file.close()
+        rows, offset, columns = parse(filename, jobname, offset, load_columns(dump_columns(columns)), final=False)
+        self.assertEqual(rows, 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT spec, schedule FROM test ORDER BY schedule')
+            res = cursor.fetchall()
+            self.assertEqual(res, [(u'abc', 1), (u'def', 2), (u'ghi', 3)])
+        os.remove(filename)
+
+    def test_batches(self):
+        self.assertEqual(list(batches(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(batches([], 2)), [])
+
+    def test_with_types_wider_than_sample(self):
+        filename = 'test_logs_parser.txt'
+        jobname = 'test'
+        file = open(filename, mode='w')
+        file.write('#[a][b][c]\n')
+        file.write('1 1 1\n')
+        file.write('2 2.5 2.5\n')
+        file.write('3 3.0e+000 c\n')
+        file.close()
+        sample_size = parser.PARSER_SAMPLE_SIZE
+        parser.PARSER_SAMPLE_SIZE = 1
+        try:
+            rows, offset, columns = parse(filename, jobname)
+        finally:
+            parser.PARSER_SAMPLE_SIZE = sample_size
+
+        self.assertEqual([c.declaration() for c in columns], ['INTEGER', 'FLOAT', 'VARCHAR(3)'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT a, b, c FROM test ORDER BY a')
+            res = cursor.fetchall()
+            self.assertEqual(res, [(1, 1.0, u'1'), (2, 2.5, u'2.5'), (3, 3.0, u'c')])
+        os.remove(filename)
+
+
+class ColumnTest(TestCase):
+    def test_widths_are_widened(self):
+        column = Column('snr', 'DECIMAL')
+        self.assertTrue(column.fit('0.25'))
+        self.assertFalse(column.fit('0.5'))
+        self.assertTrue(column.fit('120.5'))
+        self.assertEqual(column.declaration(), 'DECIMAL(5,2)')
+        column = Column('spec', 'VARCHAR')
+        column.fit('R_0.17')
+        self.assertEqual(column.declaration(), 'VARCHAR(6)')
+
+    def test_type_is_widened(self):
+        column = Column('snr')
+        column.fit('12')
+        self.assertEqual(column.declaration(), 'INTEGER')
+        self.assertTrue(column.fit('0.125'))
+        self.assertEqual(column.declaration(), 'DECIMAL(5,3)')
+        self.assertTrue(column.fit('1e-3'))
+        self.assertFalse(column.fit('4'))
+        self.assertEqual(column.declaration(), 'FLOAT')
+        self.assertTrue(column.fit('none'))
+        self.assertEqual(column.declaration(), 'VARCHAR(5)')
+
+    def test_values_are_fitted_at_once(self):
+        column = Column('snr')
+        self.assertFalse(column.fit_values(['12', '-345', '6']))
+        self.assertEqual((column.type, column.digits, column.length), ('INTEGER', 3, 4))
+        self.assertTrue(column.fit_values(['0.125', '-12.5', '7']))
+        self.assertEqual(column.declaration(), 'DECIMAL(6,3)')
+        self.assertFalse(column.fit_values([]))
+        self.assertTrue(column.fit_values(['1.5e3', '2']))
+        self.assertEqual(column.declaration(), 'FLOAT')
+        self.assertTrue(column.fit_values(['3', '1-2', '.5']))
+        self.assertEqual(column.declaration(), 'VARCHAR(5)')
+
+
+class ColumnarTest(TestCase):
+    directory = 'test_logs_columns'
+
+    def write(self, filename, content, mode='w'):
+        file = open(filename, mode=mode)
+        file.write(content)
+        file.close()
+
+    def test_cache_is_written_with_table(self):
+        filename = 'test_logs_parser.txt'
+        self.write(filename, '#[spec][snr][schedule]\nabc 0.5 1\nde 1.25 2\n')
+        parse(filename, 'test', cache_dir=self.directory)
+
+        columns = read_columns(self.directory)
+        self.assertEqual(list(columns.keys()), ['spec', 'snr', 'schedule'])
+        self.assertEqual(columns['spec'][:], ['abc', 'de'])
+        self.assertEqual(list(columns['snr']), [0.5, 1.25])
+        self.assertEqual(columns['schedule'].sum(), 3)
+        os.remove(filename)
+        shutil.rmtree(self.directory)
+
+    def test_cache_is_appended_and_converted(self):
+        filename = 'test_logs_parser.txt'
+        self.write(filename, '#[spec][schedule]\nabc 1\n')
+        rows, offset, columns = parse(filename, 'test', final=False, cache_dir=self.directory)
+        self.write(filename, 'de x2\n', mode='a')
+        parse(filename, 'test', offset, columns, final=False, cache_dir=self.directory)
+
+        columns = read_columns(self.directory)
+        self.assertEqual(columns['spec'][:], ['abc', 'de'])
+        self.assertEqual(columns['schedule'][:], ['1', 'x2'])
+        os.remove(filename)
+        shutil.rmtree(self.directory)
+
+    def test_converted_values_are_read_from_table(self):
+        filename = 'test_logs_parser.txt'
+        self.write(filename, '#[schedule]\n9007199254740993\n')
+        rows, offset, columns = parse(filename, 'test', final=False, cache_dir=self.directory)
+        self.write(filename, 'x\n', mode='a')
+        parse(filename, 'test', offset, columns, final=False, cache_dir=self.directory)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT schedule FROM test ORDER BY row_id')
+            table = [str(value) for value, in cursor.fetchall()]
+        self.assertEqual(table, ['9007199254740993', 'x'])
+        self.assertEqual(read_columns(self.directory)['schedule'][:], table)
         os.remove(filename)
+        shutil.rmtree(self.directory)
+
+    def test_without_cache(self):
+        self.assertEqual(read_columns(self.directory), None)
+
+
+class OutFileTest(TestCase):
+    filename = 'test_logs_reader.txt'
+
+    def write(self, content, mode='w'):
+        file = open(self.filename, mode=mode)
+        file.write(content)
+        file.close()
+
+    def test_rows(self):
+        self.write('#[schedule]\n' + ''.join('{0}\n'.format(i) for i in range(10)) + '\n10')
+        with OutFile(self.filename) as out:
+            self.assertEqual(len(out), 0)
+        index_out_file(self.filename)
+        with OutFile(self.filename) as out:
+            self.assertEqual(out.header, '#[schedule]\n')
+            self.assertEqual(len(out), 11)
+            self.assertEqual(out.rows(3, 5), ['3', '4'])
+            self.assertEqual(out.rows(10, 20), ['10'])
+        os.remove(self.filename)
+        os.remove(self.filename + '.idx')
+
+    def test_index_is_extended(self):
+        self.write('#[schedule]\n1\n2\n3')
+        index_out_file(self.filename, final=False)
+        with OutFile(self.filename) as out:
+            self.assertEqual(out.rows(0, 10), ['1', '2'])
+        self.write('4\n5\n', mode='a')
+        index_out_file(self.filename, final=False)
+        with OutFile(self.filename) as out:
+            self.assertEqual(out.rows(0, 10), ['1', '2', '34', '5'])
+        os.remove(self.filename)
+        os.remove(self.filename + '.idx')
+
+    def test_sample_lines(self):
+        self.write('#[schedule]\n' + ''.join('{0}\n'.format(i) for i in range(10)) + '\n10')
+        with open(self.filename) as file:
+            file.readline()
+            start = file.tell()
+            size = os.path.getsize(self.filename)
+            self.assertEqual(sample_lines(file, start, size, 3), ['0', '4', '8'])
+            self.assertEqual(sample_lines(file, start, size, 20), [str(i) for i in range(11)])
+        self.assertFalse(os.path.exists(self.filename + '.idx'))
+        os.remove(self.filename)
 
 
 class DaemonTest(TestCase):
@@ -96,13 +356,13 @@ class DaemonTest(TestCase):
         })
 
         schedd = Schedd()
-        job_entry = JobIdModel(job_name=u'helloworld', cluster_id=schedd.submit(ad, spool=False))
+        job_entry = Job(job_name=u'helloworld', status='q', cluster_id=schedd.submit(ad, spool=False))
         job_entry.save()
 
         sleep(15)
         check_history()
         try:
-            job = FinishedJobs.objects.get(cluster_id=job_entry.cluster_id)
+            job = Job.objects.get(cluster_id=job_entry.cluster_id, status='d')
         except ObjectDoesNotExist:
             job = None
         self.assertTrue(job != None)
@@ -113,14 +373,327 @@ class DaemonTest(TestCase):
         os.rmdir(WORKING_DIRECTORY + '/helloworld')
 
 
+class IngestTest(TestCase):
+    def add_dir(self, name, content):
+        os.mkdir('{0}/{1}'.format(WORKING_DIRECTORY, name))
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='w')
+        file.write(content)
+        file.close()
+
+    def rm_dir(self, name):
+        shutil.rmtree('{0}/{1}'.format(WORKING_DIRECTORY, name))
+
+    def test_with_good_and_broken_jobs(self):
+        self.add_dir('test_good', '#[spec][schedule]\nabc 1\ndef 2\n')
+        self.add_dir('test_broken', 'no header\n1 2\n')
+        Job(job_name='test_good', status='q', cluster_id=1).save()
+        Job(job_name='test_broken', status='r', cluster_id=2).save()
+
+        ingest_jobs(['test_good', 'test_broken'])
+
+        good = Job.objects.get(job_name='test_good')
+        self.assertEqual(good.status, 'd')
+        self.assertEqual(good.rows, 2)
+        self.assertTrue(good.has_out)
+        self.assertIsNotNone(good.finished)
+        broken = Job.objects.get(job_name='test_broken')
+        self.assertEqual(broken.status, 'f')
+        self.assertNotEqual(broken.error, '')
+        # lines of a job which could not be loaded are indexed to be viewed
+        self.assertTrue(os.path.exists('{0}/test_broken/out.idx'.format(WORKING_DIRECTORY)))
+        # jobs are claimed by their status, finished and failed ones are not loaded again
+        ingest_jobs(['test_good', 'test_broken'])
+        self.assertEqual(JobIngest.objects.get(job_name='test_good').version, 1)
+        self.assertEqual(Job.objects.get(job_name='test_broken').finished, broken.finished)
+        self.rm_dir('test_good')
+        self.rm_dir('test_broken')
+
+    def test_with_running_job(self):
+        self.add_dir('test_running', '#[spec][schedule]\nabc 1\n')
+        Job(job_name='test_running', status='q', cluster_id=1).save()
+
+        ingest_running_jobs()
+        job = Job.objects.get(job_name='test_running')
+        self.assertEqual(job.status, 'r')
+        self.assertTrue(job.has_out)
+        self.assertEqual(job.rows, 1)
+        file = open('{0}/test_running/out'.format(WORKING_DIRECTORY), mode='a')
+        file.write('def 2\n')
+        file.close()
+        ingest_running_jobs()
+        self.assertEqual(Job.objects.get(job_name='test_running').rows, 2)
+        ingest_jobs(['test_running'])
+
+        self.assertEqual(Job.objects.get(job_name='test_running').status, 'd')
+        self.assertEqual(Job.objects.get(job_name='test_running').rows, 2)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM test_running')
+            self.assertEqual(cursor.fetchone()[0], 2)
+        self.rm_dir('test_running')
+
+    def test_with_per_proc_outputs(self):
+        self.add_dir('test_procs', '')
+        os.remove('{0}/test_procs/out'.format(WORKING_DIRECTORY))
+        outputs = {0: '#[code][snr]\nldpc 1\nldpc 2\n', 1: '#[code][snr]\npolar 1', 12: '#[code][snr]\npolar 2.5\n'}
+        for proc_id, content in outputs.items():
+            file = open('{0}/test_procs/out.{1}'.format(WORKING_DIRECTORY, proc_id), mode='w')
+            file.write(content)
+            file.close()
+        Job(job_name='test_procs', status='q', cluster_id=1).save()
+
+        ingest_running_jobs()
+        job = Job.objects.get(job_name='test_procs')
+        self.assertTrue(job.has_out)
+        # the last line of out.1 may still be written
+        self.assertEqual(job.rows, 3)
+        file = open('{0}/test_procs/out.1'.format(WORKING_DIRECTORY), mode='a')
+        file.write('\npolar 3\n')
+        file.close()
+        ingest_jobs(['test_procs'])
+
+        self.assertEqual(Job.objects.get(job_name='test_procs').rows, 5)
+        columns = load_columns(JobIngest.objects.get(job_name='test_procs').columns)
+        self.assertEqual([(c.name, c.type) for c in columns],
+                         [('code', 'VARCHAR'), ('snr', 'DECIMAL'), ('proc_id', 'INTEGER')])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT proc_id, code, snr FROM test_procs ORDER BY proc_id, snr')
+            self.assertEqual([(row[0], row[1], float(row[2])) for row in cursor.fetchall()],
+                             [(0, 'ldpc', 1), (0, 'ldpc', 2), (1, 'polar', 1), (1, 'polar', 3), (12, 'polar', 2.5)])
+        self.assertEqual(list(read_columns('{0}/test_procs/columns'.format(WORKING_DIRECTORY))['proc_id']),
+                         [0, 0, 12, 1, 1])
+        self.rm_dir('test_procs')
+
+    def test_per_proc_outputs_are_parsed_concurrently(self):
+        self.add_dir('test_parallel', '')
+        files = []
+        for proc_id in range(6):
+            filename = '{0}/test_parallel/out.{1}'.format(WORKING_DIRECTORY, proc_id)
+            file = open(filename, mode='w')
+            file.write('#[n][value]\n' + ''.join('{0} {1}\n'.format(i, proc_id * 10 ** i) for i in range(proc_id + 1)))
+            file.close()
+            files.append((proc_id, filename))
+
+        rows, offsets, columns = parser.parse_procs(files, 'test_parallel', {}, workers=3)
+        self.assertEqual(rows, 21)
+        self.assertEqual(offsets, dict((str(proc_id), os.path.getsize(filename)) for proc_id, filename in files))
+        self.assertEqual(columns[1].digits, 6)
+        self.assertEqual(parser.parse_procs(files, 'test_parallel', offsets, columns, workers=3)[0], 0)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT SUM(value) FROM test_parallel WHERE proc_id = 5')
+            self.assertEqual(cursor.fetchone()[0], 555555)
+        self.rm_dir('test_parallel')
+
+    def test_per_proc_outputs_are_staged(self):
+        self.add_dir('test_stage', '')
+        os.remove('{0}/test_stage/out'.format(WORKING_DIRECTORY))
+        outputs = {0: '#[snr][fer][code]\n1 0.5 7\n2 0.25 8\n', 1: '#[snr][fer][code]\n1 0.75 c9\n'}
+        for proc_id, content in outputs.items():
+            file = open('{0}/test_stage/out.{1}'.format(WORKING_DIRECTORY, proc_id), mode='w')
+            file.write(content)
+            file.close()
+        Job(job_name='test_stage', status='r', cluster_id=1, parameters='snr').save()
+
+        ingest_jobs(['test_stage'])
+        self.assertEqual(Job.objects.get(job_name='test_stage').rows, 3)
+        self.assertEqual([(row['value'], row['column'], row['count'], row['mean'])
+                          for row in job_summary('test_stage', 'snr')], [('1', 'fer', 2, 0.625), ('2', 'fer', 1, 0.25)])
+        # a column which became VARCHAR in the second file is converted in the cache of the first one
+        cache = read_columns('{0}/test_stage/columns'.format(WORKING_DIRECTORY))
+        self.assertEqual(cache['code'][:], ['7', '8', 'c9'])
+        self.assertEqual(list(cache['proc_id']), [0, 0, 1])
+        self.assertEqual(os.listdir('{0}/test_stage/columns'.format(WORKING_DIRECTORY)).count('proc.0'), 0)
+        self.assertEqual([name for name in connection.introspection.table_names() if '__proc_' in name], [])
+        self.rm_dir('test_stage')
+
+    def test_per_proc_output_with_partial_header(self):
+        self.add_dir('test_partial', '')
+        first = '{0}/test_partial/out.0'.format(WORKING_DIRECTORY)
+        late = '{0}/test_partial/out.123456'.format(WORKING_DIRECTORY)
+        with open(first, mode='w') as file:
+            file.write('#[spec][n]\nabc 1\n')
+        rows, offsets, columns = parser.parse_procs([(0, first)], 'test_partial', {}, final=False)
+        with open(late, mode='w') as file:
+            file.write('#[sp')
+        files = [(0, first), (123456, late)]
+
+        task = (late, 0, None, False, 'test_partial', 123456, None, None)
+        self.assertEqual(parser.stage_proc_output(task), (None, [], 0, 0, None))
+        rows, offsets, columns = parser.parse_procs(files, 'test_partial', offsets, columns, final=False)
+        self.assertEqual(rows, 0)
+        self.assertFalse('123456' in offsets)
+        self.assertEqual([c.declaration() for c in columns], ['VARCHAR(3)', 'INTEGER', 'INTEGER'])
+
+        with open(late, mode='a') as file:
+            file.write('ec][n]\nde 22\nfghi 3')
+        names, fits, count, offset, stats = parser.stage_proc_output(task)
+        self.assertEqual((names, count, offset), (['spec', 'n'], 1, len('#[spec][n]\nde 22\n')))
+        rows, offsets, columns = parser.parse_procs(files, 'test_partial', offsets, columns, final=False)
+        self.assertEqual(rows, 1)
+        rows, offsets, columns = parser.parse_procs(files, 'test_partial', offsets, columns)
+        self.assertEqual(rows, 1)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT spec, n, proc_id FROM test_partial ORDER BY row_id')
+            self.assertEqual(cursor.fetchall(), [('abc', 1, 0), ('de', 22, 123456), ('fghi', 3, 123456)])
+        self.assertEqual([c.declaration() for c in columns], ['VARCHAR(4)', 'INTEGER', 'INTEGER'])
+        self.rm_dir('test_partial')
+
+    def test_interrupted_load_is_resumed(self):
+        self.add_dir('test_resumed', '#[spec][schedule]\nabc 1\ndef 2\n')
+        Job(job_name='test_resumed', status='i', cluster_id=1).save()
+        self.assertFalse(Job.transition('test_resumed', ['q', 'r'], 'i'))
+
+        resume_ingest()
+        self.assertEqual(Job.objects.get(job_name='test_resumed').status, 'd')
+        self.assertEqual(Job.objects.get(job_name='test_resumed').rows, 2)
+        self.rm_dir('test_resumed')
+
+    def test_load_interrupted_after_final_load_is_not_repeated(self):
+        self.add_dir('test_resumed', '#[spec][schedule]\nabc 1\ndef 2\n')
+        Job(job_name='test_resumed', status='i', cluster_id=1).save()
+        # the daemon stopped after the final load had been committed, before the job was moved to Finished
+        load_out_file(JobIngest.objects.create(job_name='test_resumed'), True)
+        self.assertTrue(JobIngest.objects.get(job_name='test_resumed').final)
+
+        resume_ingest()
+        job = Job.objects.get(job_name='test_resumed')
+        self.assertEqual((job.status, job.rows, job.error), ('d', 2, ''))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM test_resumed')
+            self.assertEqual(cursor.fetchone()[0], 2)
+        self.rm_dir('test_resumed')
+
+
+class FakeSchedd:
+    """ A stand-in for htcondor.Schedd returning predefined history records, and procs of jobs in the queue."""
+    def __init__(self, records, queue=()):
+        self.records = records
+        self.queue = [ClassAd({'SporeJob': job_name, 'ProcId': 0}) for job_name in queue]
+        self.constraints = []
+
+    def query(self, constraint, projection, callback=None, limit=-1):
+        ads = [ad for ad in self.queue if ExprTree(constraint).eval(ad)]
+        return ads[:limit] if limit >= 0 else ads
+
+    def history(self, constraint, projection, match):
+        self.constraints.append(str(constraint))
+        return iter(self.records)
+
+
+class HistoryTest(TestCase):
+    def test_constraint(self):
+        self.assertEqual(history_constraint([3, 5], 100), 'member(ClusterId, {3, 5}) && CompletionDate >= 100')
+
+    def test_with_no_tracked_jobs(self):
+        schedd = FakeSchedd([])
+        check_history(schedd)
+        self.assertEqual(schedd.constraints, [])
+
+    def test_checkpoint_is_moved(self):
+        os.mkdir('{0}/test_history'.format(WORKING_DIRECTORY))
+        file = open('{0}/test_history/out'.format(WORKING_DIRECTORY), mode='w')
+        file.write('#[schedule]\n1\n')
+        file.close()
+        Job(job_name='test_history', status='r', cluster_id=7).save()
+        Job(job_name='test_running', status='q', cluster_id=8).save()
+        schedd = FakeSchedd([{'ClusterId': 7, 'CompletionDate': 1500}, {'ClusterId': 7, 'CompletionDate': 1400}])
+
+        check_history(schedd)
+
+        self.assertEqual(schedd.constraints, [str(ExprTree(history_constraint([7, 8], 0)))])
+        self.assertEqual(Job.objects.get(job_name='test_history').status, 'd')
+        self.assertEqual(Job.objects.get(job_name='test_running').status, 'q')
+        self.assertEqual(HistoryCheckpoint.get().completion_date, 1500)
+        check_history(schedd)
+        self.assertEqual(schedd.constraints[-1],
+                         str(ExprTree(history_constraint([8], 1500 - HISTORY_CHECK_WINDOW))))
+        self.assertEqual(HistoryCheckpoint.get().completion_date, 1500)
+        shutil.rmtree('{0}/test_history'.format(WORKING_DIRECTORY))
+
+    def test_job_in_several_clusters(self):
+        os.mkdir('{0}/test_clusters'.format(WORKING_DIRECTORY))
+        file = open('{0}/test_clusters/out'.format(WORKING_DIRECTORY), mode='w')
+        file.write('#[schedule]\n1\n')
+        file.close()
+        Job(job_name='test_clusters', status='s', cluster_id=7).save()
+        SubmittedCluster(job_name='test_clusters', cluster_id=7, first_proc=0, count=10).save()
+
+        check_history(FakeSchedd([{'ClusterId': 7, 'CompletionDate': 1500}]))
+        self.assertEqual(Job.objects.get(job_name='test_clusters').status, 's')
+        SubmittedCluster(job_name='test_clusters', cluster_id=9, first_proc=10, count=10).save()
+        Job.transition('test_clusters', ['s'], 'q')
+        # a record of one proc does not finish a job whose other procs are still queued
+        schedd = FakeSchedd([{'ClusterId': 9, 'CompletionDate': 1500}], queue=['test_clusters'])
+        check_history(schedd)
+        self.assertEqual(schedd.constraints, [str(ExprTree(history_constraint([7, 9], 0)))])
+        self.assertEqual(Job.objects.get(job_name='test_clusters').status, 'q')
+        # the last proc to leave may be one of an earlier cluster
+        check_history(FakeSchedd([{'ClusterId': 7, 'CompletionDate': 1600}]))
+        self.assertEqual(Job.objects.get(job_name='test_clusters').status, 'd')
+        shutil.rmtree('{0}/test_clusters'.format(WORKING_DIRECTORY))
+
+
+class FakeEvent:
+    def __init__(self, type, cluster, proc):
+        self.type = type
+        self.cluster = cluster
+        self.proc = proc
+
+
+class FakeEventLog:
+    """ A stand-in for htcondor.JobEventLog reading lines like 'SUBMIT 7 0' from a text file."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.offset = 0
+
+    def events(self, stop_after=None):
+        with open(self.filename) as file:
+            file.seek(self.offset)
+            lines = file.readlines()
+            self.offset = file.tell()
+        for line in lines:
+            type, cluster, proc = line.split()
+            yield FakeEvent(getattr(JobEventType, type), int(cluster), int(proc))
+
+
+class EventsTest(TestCase):
+    def write_log(self, lines):
+        file = open('{0}/test_events/log'.format(WORKING_DIRECTORY), mode='a')
+        file.write(lines)
+        file.close()
+
+    def test_job_is_loaded_when_all_procs_terminate(self):
+        os.mkdir('{0}/test_events'.format(WORKING_DIRECTORY))
+        file = open('{0}/test_events/out'.format(WORKING_DIRECTORY), mode='w')
+        file.write('#[schedule]\n1\n2\n')
+        file.close()
+        self.write_log('SUBMIT 7 0\nSUBMIT 7 1\nEXECUTE 7 0\n')
+        Job(job_name='test_events', status='q', cluster_id=7).save()
+        watchers = {}
+
+        check_events(watchers, FakeEventLog)
+        self.assertEqual(Job.objects.get(job_name='test_events').status, 'q')
+        self.write_log('JOB_TERMINATED 7 0\n')
+        check_events(watchers, FakeEventLog)
+        self.assertEqual(Job.objects.get(job_name='test_events').status, 'q')
+        self.write_log('JOB_ABORTED 7 1\n')
+        check_events(watchers, FakeEventLog)
+        self.assertEqual(Job.objects.get(job_name='test_events').status, 'd')
+        check_events(watchers, FakeEventLog)
+        self.assertEqual(watchers, {})
+
+        shutil.rmtree('{0}/test_events'.format(WORKING_DIRECTORY))
+
+
 class LogsTest(TestCase):
+    def setUp(self):
+        cache.clear()
 
-    def add_finished_job(self, name, cluster_id):
-        job = FinishedJobs(job_name=name, cluster_id=cluster_id)
+    def add_finished_job(self, name, cluster_id, has_out=True):
+        job = Job(job_name=name, status='d', cluster_id=cluster_id, has_out=has_out)
         job.save()
 
-    def add_unfinished_job(self, name, cluster_id):
-        job = JobIdModel(job_name=name, cluster_id=cluster_id)
+    def add_unfinished_job(self, name, cluster_id, has_out=True):
+        job = Job(job_name=name, status='r' if has_out else 'q', cluster_id=cluster_id, has_out=has_out)
         job.save()
 
     def add_dir(self, name):
@@ -179,33 +752,59 @@ class LogsTest(TestCase):
         self.rm_dir('test_finished_job')
         self.rm_dir('test_unfinished_job')
 
+    def test_logs_are_searched_and_paged(self):
+        for i in range(60):
+            self.add_finished_job('run{0:02d}'.format(i), i)
+        self.add_finished_job('other', 100)
+        self.add_finished_job('run_without_out', 101, has_out=False)
+        response = self.client.get(reverse('logs:index'), {'q': 'run'})
+        self.assertEqual(response.context['finished_jobs'], ['run{0:02d}'.format(i) for i in range(50)])
+        self.assertEqual(response.context['finished_next'], 'q=run&finished_after=run49')
+        response = self.client.get(reverse('logs:index') + '?' + response.context['finished_next'])
+        self.assertEqual(response.context['finished_jobs'], ['run{0:02d}'.format(i) for i in range(50, 60)])
+        self.assertEqual(response.context['finished_next'], None)
+
+    def test_out_file_is_noticed_by_daemon(self):
+        self.add_unfinished_job('test_noticed', 1, has_out=False)
+        self.assertEqual(self.client.get(reverse('logs:index')).context['unfinished_jobs'], [])
+        os.mkdir('{0}/test_noticed'.format(WORKING_DIRECTORY))
+        file = open('{0}/test_noticed/out'.format(WORKING_DIRECTORY), mode='w')
+        file.write('#[schedule]\n1\n')
+        file.close()
+        ingest_running_jobs()
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('logs:index')).context['unfinished_jobs'], ['test_noticed'])
+        shutil.rmtree('{0}/test_noticed'.format(WORKING_DIRECTORY))
+
 
 class LogsDetailTest(TestCase):
 
-    test_string = 'Hi! I\'m a test string!'
+    out_string = '#[spec][snr][schedule]\nabc 0.5 3\ndef 0.25 1\nghi 0.5 2\n'
+
+    def setUp(self):
+        cache.clear()
 
     def add_finished_job(self, name, cluster_id):
-        job = FinishedJobs(job_name=name, cluster_id=cluster_id)
+        job = Job(job_name=name, status='d', cluster_id=cluster_id)
         job.save()
 
     def add_unfinished_job(self, name, cluster_id):
-        job = JobIdModel(job_name=name, cluster_id=cluster_id)
+        job = Job(job_name=name, status='r', cluster_id=cluster_id)
         job.save()
 
-    def add_dir(self, name):
+    def add_dir(self, name, content=''):
         if not os.path.exists('{0}/{1}'.format(WORKING_DIRECTORY, name)):
             os.mkdir('{0}/{1}'.format(WORKING_DIRECTORY, name))
             f = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='w')
+            f.write(content)
             f.close()
-            ff = open('{0}/{1}/log'.format(WORKING_DIRECTORY, name), mode='w')
-            ff.write(self.test_string)
-            ff.write('\n')
-            ff.close()
 
     def rm_dir(self, name):
-        os.remove('{0}/{1}/out'.format(WORKING_DIRECTORY, name))
-        os.remove('{0}/{1}/log'.format(WORKING_DIRECTORY, name))
-        os.rmdir('{0}/{1}'.format(WORKING_DIRECTORY, name))
+        shutil.rmtree('{0}/{1}'.format(WORKING_DIRECTORY, name))
+
+    def load(self, name):
+        ingest = JobIngest(job_name=name)
+        load_out_file(ingest, True)
 
     def test_with_unexisting_job(self):
         response = self.client.get(reverse('logs:detail', args=('test',)))
@@ -218,7 +817,342 @@ class LogsDetailTest(TestCase):
         response = self.client.get(reverse('logs:detail', args=(name,)))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, name)
-        self.assertContains(response, self.test_string)
-        self.assertQuerysetEqual(response.context['filename'], "u'{0}/{1}/log".format(WORKING_DIRECTORY, name))
-        self.assertQuerysetEqual(response.context['job_name'], "u'{0}".format(name))
-        self.rm_dir(name)
\ No newline at end of file
+        self.assertContains(response, 'There are no results yet.')
+        self.assertEqual(response.context['job_name'], name)
+        self.rm_dir(name)
+
+    def test_with_unloaded_job(self):
+        name = 'test_job'
+        self.add_unfinished_job(name, 15)
+        self.add_dir(name, self.out_string)
+        index_out_file('{0}/{1}/out'.format(WORKING_DIRECTORY, name))
+        response = self.client.get(reverse('logs:rows', args=(name,)))
+        self.assertEqual(response.json()['columns'], ['spec', 'snr', 'schedule'])
+        self.assertEqual(response.json()['rows'][1], ['def', '0.25', '1'])
+        self.rm_dir(name)
+
+    def test_with_unloaded_procs(self):
+        name = 'test_job'
+        self.add_unfinished_job(name, 15)
+        self.add_dir(name)
+        for proc_id, content in enumerate([self.out_string, '#[spec][snr][schedule]\njkl 0.125 4\n']):
+            filename = '{0}/{1}/out.{2}'.format(WORKING_DIRECTORY, name, proc_id)
+            with open(filename, 'w') as f:
+                f.write(content)
+            index_out_file(filename)
+        page = get_page(name, size=2)
+        self.assertEqual(page['columns'], ['spec', 'snr', 'schedule', 'proc_id'])
+        self.assertEqual(page['rows'], [['abc', '0.5', '3', '0'], ['def', '0.25', '1', '0']])
+        page = get_page(name, after_id=page['after_id'], size=2)
+        self.assertEqual(page['rows'], [['ghi', '0.5', '2', '0'], ['jkl', '0.125', '4', '1']])
+        self.assertEqual(page['after_id'], None)
+        self.rm_dir(name)
+
+    def test_with_loaded_job(self):
+        name = 'test_job'
+        self.add_finished_job(name, 15)
+        self.add_dir(name, self.out_string)
+        self.load(name)
+        response = self.client.get(reverse('logs:detail', args=(name,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'def')
+        self.assertEqual(response.context['page']['rows'][0], ['abc', Decimal('0.5'), 3])
+        self.assertEqual(response.context['next_query'], None)
+        self.rm_dir(name)
+
+    def test_pages_are_sorted(self):
+        name = 'test_job'
+        self.add_finished_job(name, 15)
+        self.add_dir(name, self.out_string)
+        self.load(name)
+        page = get_page(name, columns=['spec'], sort='-snr', size=2)
+        self.assertEqual(page['rows'], [['ghi'], ['abc']])
+        page = get_page(name, columns=['spec'], sort='-snr', after=page['after'], after_id=page['after_id'], size=2)
+        self.assertEqual(page['rows'], [['def']])
+        self.assertEqual(page['after_id'], None)
+        response = self.client.get(reverse('logs:rows', args=(name,)), {'columns': 'spec,schedule', 'sort': 'schedule'})
+        self.assertEqual(response.json()['rows'], [['def', 1], ['ghi', 2], ['abc', 3]])
+        response = self.client.get(reverse('logs:rows', args=(name,)), {'sort': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+        self.rm_dir(name)
+
+
+
+class PlotTest(TestCase):
+    def add_job(self, name, count):
+        os.mkdir('{0}/{1}'.format(WORKING_DIRECTORY, name))
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='w')
+        file.write('#[snr][fer]\n')
+        for i in range(count):
+            file.write('{0} {1}\n'.format(count - i, (count - i) % 7))
+        file.close()
+        Job(job_name=name, status='d', cluster_id=1).save()
+        load_out_file(JobIngest(job_name=name), True)
+
+    def test_lttb(self):
+        x = numpy.arange(100, dtype=float)
+        y = numpy.zeros(100)
+        y[50] = 10
+        dx, dy = lttb(x, y, 10)
+        self.assertEqual(len(dx), 10)
+        self.assertEqual((dx[0], dx[-1]), (0, 99))
+        self.assertTrue(50 in dx)
+        self.assertEqual(len(lttb(x, y, 200)[0]), 100)
+
+    def test_minmax(self):
+        x = numpy.arange(10, dtype=float)
+        y = numpy.array([3, 1, 2, 9, 5, 4, 0, 8, 7, 6], dtype=float)
+        dx, dy = minmax(x, y, 2)
+        self.assertEqual(list(dx), [1, 3, 6, 7])
+        self.assertEqual(list(dy), [1, 9, 0, 8])
+
+    def test_plot_from_cache_and_table(self):
+        name = 'test_plot'
+        self.add_job(name, 1000)
+        self.assertTrue(os.path.exists('{0}/{1}/columns/0.1000.order'.format(WORKING_DIRECTORY, name)))
+        series = plot_series(name, 'snr', 'fer', 100)
+        self.assertEqual(series['total'], 1000)
+        self.assertEqual(len(series['x']), 100)
+        self.assertEqual((series['x'][0], series['x'][-1]), (1.0, 1000.0))
+        zoomed = plot_series(name, 'snr', 'fer', 100, 10, 19)
+        self.assertEqual(zoomed['x'], [float(i) for i in range(10, 20)])
+        self.assertEqual(zoomed['y'], [float(i % 7) for i in range(10, 20)])
+
+        shutil.rmtree('{0}/{1}/columns'.format(WORKING_DIRECTORY, name))
+        self.assertEqual(plot_series(name, 'snr', 'fer', 100, 10, 19), zoomed)
+        response = self.client.get(reverse('logs:plot', args=(name,)), {'x': 'snr', 'y': 'none'})
+        self.assertEqual(response.status_code, 400)
+        for width in ('9', '10001', 'wide'):
+            response = self.client.get(reverse('logs:plot', args=(name,)), {'x': 'snr', 'y': 'fer', 'width': width})
+            self.assertEqual(response.status_code, 400)
+        shutil.rmtree('{0}/{1}'.format(WORKING_DIRECTORY, name))
+
+    def test_running_job_is_not_sorted_on_request(self):
+        name = 'test_plot'
+        os.mkdir('{0}/{1}'.format(WORKING_DIRECTORY, name))
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='w')
+        file.write('#[snr][fer]\n3 1\n1 2\n2 3\n')
+        file.close()
+        Job(job_name=name, status='r', cluster_id=1).save()
+        load_out_file(JobIngest(job_name=name), False)
+
+        series = plot_series(name, 'snr', 'fer', 10)
+        self.assertEqual((series['x'], series['y']), ([1.0, 2.0, 3.0], [2.0, 3.0, 1.0]))
+        directory = '{0}/{1}/columns'.format(WORKING_DIRECTORY, name)
+        self.assertEqual([f for f in os.listdir(directory) if f.endswith(('.sorted', '.order'))], [])
+        shutil.rmtree('{0}/{1}'.format(WORKING_DIRECTORY, name))
+
+
+class ExportTest(TestCase):
+    def test_export(self):
+        name = 'test_export'
+        os.mkdir('{0}/{1}'.format(WORKING_DIRECTORY, name))
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='w')
+        file.write('#[snr][fer][code]\n')
+        for i in range(12):
+            file.write('{0} {0}.5 c{0}\n'.format(i))
+        file.close()
+        Job(job_name=name, status='d', cluster_id=1).save()
+        load_out_file(JobIngest(job_name=name), True)
+
+        response = self.client.get(reverse('logs:export', args=(name, 'csv')))
+        self.assertTrue(response.streaming)
+        lines = ''.join(response.streaming_content).splitlines()
+        self.assertEqual(lines[0], 'snr,fer,code')
+        self.assertEqual(lines[1:], ['{0},{0}.5,c{0}'.format(i) for i in range(12)])
+
+        response = self.client.get(reverse('logs:export', args=(name, 'json')), {'columns': 'code,snr', 'gzip': '1'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="test_export.json.gz"')
+        rows = json.loads(zlib.decompress(''.join(response.streaming_content), 16 + zlib.MAX_WBITS))
+        self.assertEqual(rows, [{'code': 'c' + str(i), 'snr': i} for i in range(12)])
+
+        response = self.client.get(reverse('logs:export', args=(name, 'csv')), {'columns': 'none'})
+        self.assertEqual(response.status_code, 400)
+        shutil.rmtree('{0}/{1}'.format(WORKING_DIRECTORY, name))
+
+
+class RollupTest(TestCase):
+    def test_merge(self):
+        a = [1.0, 2.0, 4.0]
+        b = [3.0, 5.0, 6.0, 10.0]
+        stat_a = [3, numpy.mean(a), numpy.var(a) * 3, 1.0, 4.0]
+        stat_b = [4, numpy.mean(b), numpy.var(b) * 4, 3.0, 10.0]
+        count, mean, m2, low, high = merge(stat_a, stat_b)
+        self.assertEqual((count, low, high), (7, 1.0, 10.0))
+        self.assertAlmostEqual(mean, numpy.mean(a + b))
+        self.assertAlmostEqual(m2, numpy.var(a + b) * 7)
+
+    def test_statistics_of_running_job(self):
+        name = 'test_rollup'
+        os.mkdir('{0}/{1}'.format(WORKING_DIRECTORY, name))
+        values = [(snr, snr * 0.5 + k, 'c' + str(k)) for k in range(4) for snr in range(3)]
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='w')
+        file.write('#[snr][fer][code]\n')
+        for row in values[:5]:
+            file.write('{0} {1} {2}\n'.format(*row))
+        file.close()
+        Job(job_name=name, status='r', cluster_id=1, parameters='snr code').save()
+
+        ingest_running_jobs()
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='a')
+        for row in values[5:]:
+            file.write('{0} {1} {2}\n'.format(*row))
+        file.close()
+        ingest_jobs([name])
+
+        self.assertEqual(set(ResultSummary.objects.filter(job_name=name).values_list('column', flat=True)), {'fer'})
+        for parameter, index in (('', None), ('snr', 0), ('code', 2)):
+            rows = job_summary(name, parameter)
+            keys = sorted(set(str(row[index]) if index is not None else '' for row in values))
+            self.assertEqual([row['value'] for row in rows], keys)
+            for row in rows:
+                fers = [v[1] for v in values if index is None or str(v[index]) == row['value']]
+                self.assertEqual(row['count'], len(fers))
+                self.assertAlmostEqual(row['mean'], numpy.mean(fers))
+                self.assertAlmostEqual(row['stddev'], numpy.std(fers, ddof=1))
+                self.assertEqual((row['min'], row['max']), (min(fers), max(fers)))
+        response = self.client.get(reverse('logs:summary', args=(name,)), {'parameter': 'snr'})
+        self.assertEqual(len(json.loads(response.content)['rows']), 3)
+        shutil.rmtree('{0}/{1}'.format(WORKING_DIRECTORY, name))
+
+
+class ProcsTest(TestCase):
+    def test_rows_are_tagged_with_proc_id(self):
+        name = 'test_procs'
+        os.mkdir('{0}/{1}'.format(WORKING_DIRECTORY, name))
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='w')
+        file.write('#[snr][code][fer]\n1 ldpc 0.5\n2 ldpc 0.25\n')
+        file.close()
+        Job(job_name=name, status='r', cluster_id=5, parameters='snr code').save()
+        combos = [('1', 'ldpc'), ('2', 'ldpc'), ('1', 'polar'), ('2', 'polar')]
+        ProcParameter.objects.bulk_create(
+            [ProcParameter(cluster_id=5, proc_id=i, name='snr', value=snr) for i, (snr, code) in enumerate(combos)] +
+            [ProcParameter(cluster_id=5, proc_id=i, name='code', value=code) for i, (snr, code) in enumerate(combos)])
+
+        # the table is tagged from the first part, so the rest is tagged too
+        load_out_file(JobIngest(job_name=name, offset=0), False)
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='a')
+        file.write('1 polar 0.75\n3 polar 0.125\n')
+        file.close()
+        ingest_jobs([name])
+        self.assertEqual(load_columns(JobIngest.objects.get(job_name=name).columns)[-1].name, 'proc_id')
+        self.assertEqual(proc_ids(5, 'code', 'polar'), [2, 3])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT fer FROM test_procs WHERE proc_id IN (2, 3) ORDER BY row_id')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [0.75])
+            cursor.execute('SELECT proc_id FROM test_procs ORDER BY row_id')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [0, 1, 2, -1])
+        shutil.rmtree('{0}/{1}'.format(WORKING_DIRECTORY, name))
+
+    def test_untagged_table_is_not_tagged_later(self):
+        name = 'test_procs'
+        os.mkdir('{0}/{1}'.format(WORKING_DIRECTORY, name))
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='w')
+        file.write('#[snr][fer]\n1 0.5\n')
+        file.close()
+        Job(job_name=name, status='r', cluster_id=6, parameters='snr').save()
+        ingest = JobIngest(job_name=name)
+        load_out_file(ingest, False)
+        ProcParameter(cluster_id=6, proc_id=0, name='snr', value='1').save()
+        file = open('{0}/{1}/out'.format(WORKING_DIRECTORY, name), mode='a')
+        file.write('1 0.25\n')
+        file.close()
+        load_out_file(ingest, True)
+        self.assertEqual([c.name for c in load_columns(ingest.columns)], ['snr', 'fer'])
+        self.assertEqual(Job.objects.get(job_name=name).rows, 2)
+        shutil.rmtree('{0}/{1}'.format(WORKING_DIRECTORY, name))
+
+
+class ArchiveTest(TestCase):
+    content = '#[spec][snr]\n' + ''.join('spec{0} {1}\n'.format(i, i % 7) + ('\n' if i % 50 == 0 else '')
+                                          for i in range(1000))
+
+    def setUp(self):
+        os.mkdir('{0}/test_archive'.format(WORKING_DIRECTORY))
+        self.filename = '{0}/test_archive/out'.format(WORKING_DIRECTORY)
+        file = open(self.filename, mode='w')
+        file.write(self.content)
+        file.close()
+
+    def tearDown(self):
+        shutil.rmtree('{0}/test_archive'.format(WORKING_DIRECTORY))
+
+    def test_compressed_file_is_read_from_any_offset(self):
+        index_out_file(self.filename)
+        with OutFile(self.filename) as out:
+            rows = out.rows(0, len(out))
+        size, compressed = compress(self.filename, block_size=500)
+        self.assertEqual(size, len(self.content))
+        self.assertLess(compressed, size)
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertTrue(out_exists(self.filename))
+        self.assertEqual(out_size(self.filename), len(self.content))
+        # gzip tools see a single file
+        self.assertEqual(gzip.open(self.filename + '.gz').read(), self.content)
+
+        with BlockReader(self.filename) as reader:
+            self.assertGreater(len(reader.index), 20)
+            for offset in (0, 13, 499, 500, 4321, len(self.content) - 3, len(self.content)):
+                reader.seek(offset)
+                self.assertEqual(reader.tell(), offset)
+                line = reader.readline()
+                self.assertEqual(line, self.content[offset:self.content.find('\n', offset) + 1] if line else '')
+        with open_out_file(self.filename) as out:
+            self.assertEqual(out.header, '#[spec][snr]\n')
+            self.assertEqual(len(out), 1000)
+            self.assertEqual(out.rows(0, 1000), rows)
+            self.assertEqual(out.rows(437, 452), rows[437:452])
+            self.assertEqual(out.rows(990, 2000), rows[990:])
+        with BlockReader(self.filename) as reader:
+            reader.readline()
+            sample = sample_lines(reader, reader.tell(), reader.size, 40)
+            self.assertEqual(len(sample), 40)
+            self.assertTrue(set(sample) <= set(rows))
+        self.assertEqual(parse(self.filename, 'test_archive')[0], 1000)
+
+    def test_compressed_file_is_loaded_and_previewed(self):
+        self.assertEqual(get_page('test_archive', size=10)['rows'], [])
+        index_out_file(self.filename)
+        self.assertEqual(len(get_page('test_archive', size=10)['rows']), 10)
+        half = self.content.find('\n', len(self.content) // 2) + 1
+        file = open(self.filename, mode='w')
+        file.write(self.content[:half])
+        file.close()
+        rows, offset, columns = parse(self.filename, 'test_archive', final=False)
+        self.assertEqual(offset, half)
+        file = open(self.filename, mode='a')
+        file.write(self.content[half:])
+        file.close()
+        compress(self.filename, block_size=500)
+
+        self.assertEqual(get_page('test_archive', after_id=995, size=10)['rows'],
+                         [['spec{0}'.format(i), str(i % 7)] for i in range(995, 1000)])
+        more, offset, columns = parse(self.filename, 'test_archive', offset, columns)
+        self.assertEqual((rows + more, offset), (1000, len(self.content)))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*), SUM(snr) FROM test_archive')
+            self.assertEqual(cursor.fetchone(), (1000, sum(i % 7 for i in range(1000))))
+
+    def test_finished_job_is_archived(self):
+        proc_filename = '{0}/test_archive/out.3'.format(WORKING_DIRECTORY)
+        file = open(proc_filename, mode='w')
+        file.write(self.content)
+        file.close()
+        os.remove(self.filename)
+        Job(job_name='test_archive', status='r', cluster_id=1).save()
+        Job(job_name='test_held', status='r', cluster_id=2).save()
+        os.mkdir('{0}/test_held'.format(WORKING_DIRECTORY))
+        held_filename = '{0}/test_held/out.0'.format(WORKING_DIRECTORY)
+        file = open(held_filename, mode='w')
+        file.write(self.content)
+        file.close()
+
+        ingest_jobs(['test_archive', 'test_held'], schedd=FakeSchedd([], queue=['test_held']))
+        # a file a proc left in the queue may still write to is never compressed
+        self.assertEqual(Job.objects.get(job_name='test_held').status, 'd')
+        self.assertTrue(os.path.exists(held_filename))
+        shutil.rmtree('{0}/test_held'.format(WORKING_DIRECTORY))
+        self.assertEqual(Job.objects.get(job_name='test_archive').rows, 1000)
+        self.assertFalse(os.path.exists(proc_filename))
+        self.assertTrue(os.path.exists(proc_filename + '.gz'))
+        self.assertEqual(proc_out_files('test_archive'), [(3, proc_filename)])
@@ -4,5 +4,9 @@ from . import views
 app_name = 'logs'
 urlpatterns = [
     url(r'^$', views.index, name = 'index'),
+    url(r'^detail/(?P<job_name>\w+)/rows$', views.rows, name='rows'),
+    url(r'^detail/(?P<job_name>\w+)/plot$', views.plot, name='plot'),
+    url(r'^detail/(?P<job_name>\w+)/summary$', views.summary, name='summary'),
+    url(r'^detail/(?P<job_name>\w+)/export\.(?P<format>csv|json)$', views.export, name='export'),
     url(r'^detail/(?P<job_name>\w+)', views.detail, name='detail'),
 ]
\ No newline at end of file
@@ -4,35 +4,109 @@ import os
 
 from django.shortcuts import render
 from django.template import loader
-from django.http import Http404
+from django.http import Http404, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import urlencode
 
 from sporeweb.settings import WORKING_DIRECTORY
-from sim.models import JobIdModel
-from models import FinishedJobs
+from sim.models import Job
 from available_logs import get_available_finished_jobs
 from available_logs import get_available_unfinished_jobs
+from results import get_page
+from plots import plot_series
+from export import export_parts
+from rollup import job_summary
 
-def contains(model, job_name):
-    if model.objects.filter(job_name=job_name).exists():
-        return True
-    return False
+def check_job(job_name):
+    if not Job.objects.filter(job_name=job_name).exists()\
+            and not os.path.exists('{0}/{1}/log'.format(WORKING_DIRECTORY, job_name)):
+        raise Http404('Job does not exist')
+
+def page_arguments(request):
+    """ Reading page parameters of get_page from a query string."""
+    columns = request.GET.get('columns')
+    return {
+        'columns': columns.split(',') if columns else None,
+        'sort': request.GET.get('sort') or None,
+        'after': request.GET.get('after'),
+        'after_id': request.GET.get('after_id'),
+    }
 
 def index(request):
-    finished_jobs = get_available_finished_jobs()
-    unfinished_jobs = get_available_unfinished_jobs()
+    search = request.GET.get('q', '')
+    finished_jobs, finished_after = get_available_finished_jobs(search, request.GET.get('finished_after'))
+    unfinished_jobs, unfinished_after = get_available_unfinished_jobs(search, request.GET.get('unfinished_after'))
     context = {
+        'search': search,
         'finished_jobs': finished_jobs,
         'unfinished_jobs': unfinished_jobs,
+        'finished_next': urlencode({'q': search, 'finished_after': finished_after}) if finished_after else None,
+        'unfinished_next': urlencode({'q': search, 'unfinished_after': unfinished_after}) if unfinished_after else None,
     }
     return render(request, 'logs/index.html', context)
 
 
 def detail(request, job_name):
-    if not os.path.exists('{0}/{1}/log'.format(WORKING_DIRECTORY, job_name))\
-            and not (contains(JobIdModel, job_name) or contains(FinishedJobs, job_name)):
-        raise Http404('Job does not exist')
-    #filename = 'file://{0}/{1}/helloworld'.format(WORKING_DIRECTORY, job_name)
-    filename = 'file:///users/liza_moskovskaya/elle.html'
-    context = {'filename' : filename,
-               'job_name' : job_name,}
-    return render(request, 'logs/detail.html', context)
\ No newline at end of file
+    check_job(job_name)
+    arguments = page_arguments(request)
+    try:
+        page = get_page(job_name, **arguments)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    query = {}
+    if request.GET.get('columns'):
+        query['columns'] = request.GET['columns']
+    next_query = None
+    if page['after_id'] is not None:
+        next_query = dict(query, after_id=page['after_id'])
+        if arguments['sort'] is not None:
+            next_query.update(sort=arguments['sort'], after=page['after'])
+        next_query = urlencode(next_query)
+    context = {'job_name': job_name,
+               'page': page,
+               'sort': arguments['sort'],
+               'query': urlencode(query),
+               'next_query': next_query,}
+    return render(request, 'logs/detail.html', context)
+
+
+def rows(request, job_name):
+    check_job(job_name)
+    try:
+        page = get_page(job_name, **page_arguments(request))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(page, encoder=DjangoJSONEncoder)
+
+def plot(request, job_name):
+    check_job(job_name)
+    try:
+        xmin = float(request.GET['xmin']) if request.GET.get('xmin') else None
+        xmax = float(request.GET['xmax']) if request.GET.get('xmax') else None
+        series = plot_series(job_name, request.GET.get('x', ''), request.GET.get('y', ''),
+                             int(request.GET.get('width', 800)), xmin, xmax, request.GET.get('method', 'lttb'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(series)
+
+def summary(request, job_name):
+    check_job(job_name)
+    parameter = request.GET.get('parameter', '')
+    return JsonResponse({'parameter': parameter, 'rows': job_summary(job_name, parameter)})
+
+def export(request, job_name, format):
+    check_job(job_name)
+    columns = request.GET.get('columns')
+    compress = request.GET.get('gzip') == '1'
+    try:
+        parts = export_parts(job_name, format, columns.split(',') if columns else None, compress)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    filename = '{0}.{1}'.format(job_name, format)
+    if compress:
+        response = StreamingHttpResponse(parts, content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(parts, content_type='text/csv' if format == 'csv' else 'application/json')
+    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(filename)
+    return response
@@ -1,4 +1,4 @@
 from django.contrib import admin
-from sim.models import JobIdModel
+from sim.models import Job
 
-admin.site.register(JobIdModel)
+admin.site.register(Job)
\ No newline at end of file
@@ -0,0 +1,123 @@
+import os
+import errno
+import hashlib
+import tempfile
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from sim.models import Blob, JobFile
+from sporeweb.settings import BLOB_DIRECTORY, BLOB_GC_GRACE
+
+
+def blob_path(digest):
+    """ Path of a stored file by its SHA-256, files are spread over 256 subdirectories."""
+    return os.path.join(BLOB_DIRECTORY, digest[:2], digest)
+
+
+def stream_to_temporary(file):
+    """
+    Copying a Django file to a temporary file next to the blobs, hashing it on the way.
+    :return: A tuple (path of the temporary file, SHA-256 as a hex string, size)
+    """
+    temporary = os.path.join(BLOB_DIRECTORY, 'tmp')
+    if not os.path.exists(temporary):
+        os.makedirs(temporary)
+    sha = hashlib.sha256()
+    size = 0
+    descriptor, filename = tempfile.mkstemp(dir=temporary)
+    with os.fdopen(descriptor, 'wb') as destination:
+        for chunk in file.chunks():
+            sha.update(chunk)
+            destination.write(chunk)
+            size += len(chunk)
+    return filename, sha.hexdigest(), size
+
+
+def store_blob(file):
+    """
+    Storing a Django file in the blob store, unless a file with the same content is there already.
+    An upload received by sim.uploads.BlobUploadHandler is already hashed and is moved into the store
+    with a rename. Any other file is hashed while it is streamed to a temporary file next to the blobs.
+    Either way the file is never read twice.
+    :param file: django.core.files.File, e.g. an uploaded one
+    :return: SHA-256 of the file content as a hex string
+    """
+    digest = getattr(file, 'sha256', None)
+    uploaded = digest is not None
+    if uploaded:
+        # the upload is closed, and its temporary file unlinked if it is still there, by Django
+        file.file.flush()
+        filename, size = file.temporary_file_path(), file.size
+    else:
+        filename, digest, size = stream_to_temporary(file)
+    path = blob_path(digest)
+    with transaction.atomic():
+        blob, created = Blob.objects.get_or_create(digest=digest, defaults={'size': size})
+        if os.path.exists(path):
+            if not uploaded:
+                os.remove(filename)
+        else:
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            try:
+                os.rename(filename, path)
+            except OSError as e:
+                # the upload directory is not on the file system of the store, then it is copied once
+                if e.errno != errno.EXDEV:
+                    raise
+                file.seek(0)
+                filename = stream_to_temporary(file)[0]
+                os.rename(filename, path)
+            # stored files are shared by jobs, nobody may change them
+            os.chmod(path, 0o555)
+        if not created:
+            # protects a blob of no job from the garbage collector until it is linked
+            blob.stored = timezone.now()
+            blob.save()
+    return digest
+
+
+def add_file(job_name, file, directory):
+    """
+    Putting a Django file into a job directory as a hard link to the blob store,
+    or a symbolic link if the directory is on another file system, and referencing the blob by the job.
+    :return: Path of the file in the job directory
+    """
+    digest = store_blob(file)
+    destination = os.path.join(directory, file.name)
+    try:
+        os.link(blob_path(digest), destination)
+    except OSError:
+        os.symlink(blob_path(digest), destination)
+    JobFile(job_name=job_name, name=file.name, blob_id=digest).save()
+    return destination
+
+
+def release_job(job_name, directory):
+    """ Removing files of a job from its directory and dropping its references to the blobs."""
+    for job_file in JobFile.objects.filter(job_name=job_name):
+        path = os.path.join(directory, job_file.name)
+        if os.path.lexists(path):
+            os.remove(path)
+    JobFile.objects.filter(job_name=job_name).delete()
+
+
+def collect_garbage(grace=BLOB_GC_GRACE):
+    """
+    Deleting stored files which no job references anymore.
+    :param grace: seconds a file stays after it was stored or requested to be stored last,
+                  so that a file being added to a job is never deleted
+    :return: Number of deleted files
+    """
+    unused = Blob.objects.filter(jobfile__isnull=True, stored__lt=timezone.now() - timedelta(seconds=grace))
+    count = 0
+    for blob in unused:
+        with transaction.atomic():
+            if Blob.objects.filter(pk=blob.pk, jobfile__isnull=True, stored=blob.stored).delete()[0] == 0:
+                continue
+            if os.path.exists(blob_path(blob.digest)):
+                os.remove(blob_path(blob.digest))
+            count += 1
+    return count
@@ -1,6 +1,6 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from sim.models import JobIdModel
+from sim.models import Job
 import gettext
 
 
@@ -59,13 +59,11 @@ class JobForm(forms.Form):
         valid = super(JobForm, self).is_valid()
         if not valid:
             return valid
-        for job in JobIdModel.objects.all():
-            if self.cleaned_data['job_name'] == job.job_name:
-                valid = False
-                self.add_error('job_name', ValidationError(
-                            gettext.gettext('This name already exists'),
-                            code='duplicate_job_name'))
-                break
+        if Job.objects.filter(job_name=self.cleaned_data['job_name']).exists():
+            valid = False
+            self.add_error('job_name', ValidationError(
+                        gettext.gettext('This name already exists'),
+                        code='duplicate_job_name'))
         return valid
 
 
@@ -0,0 +1,44 @@
+from time import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sim.forms import JobForm
+from sim.models import Job
+
+
+def scan_is_valid(form):
+    """ Validating a job name by reading all jobs, as JobForm did before it looked the name up."""
+    valid = super(JobForm, form).is_valid()
+    for job in Job.objects.all():
+        if form.cleaned_data['job_name'] == job.job_name:
+            valid = False
+            break
+    return valid
+
+
+class Command(BaseCommand):
+    help = 'Compares validating the submit form by scanning all jobs and by a lookup of the name.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=100000, help='Number of generated historical jobs')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of validated forms')
+
+    def timed(self, title, is_valid, repeat):
+        start = time()
+        for i in range(repeat):
+            form = JobForm({'job_name': 'bench_new_{0}'.format(i)},
+                           {'exec_file': SimpleUploadedFile('helloworld', b'#!/bin/sh')})
+            assert is_valid(form)
+        elapsed = time() - start
+        self.stdout.write('{0}: {1:.3f} ms per form'.format(title, elapsed * 1e3 / repeat))
+
+    def handle(self, *args, **options):
+        names = ['bench_job_{0:06d}'.format(i) for i in range(options['jobs'])]
+        # everything is rolled back, the database is left as it was
+        with transaction.atomic():
+            Job.objects.bulk_create([Job(job_name=name, status='d', cluster_id=i) for i, name in enumerate(names)])
+            self.timed('Scan of all jobs', scan_is_valid, options['repeat'])
+            self.timed('Name lookup', JobForm.is_valid, options['repeat'])
+            transaction.set_rollback(True)
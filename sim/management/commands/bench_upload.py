@@ -0,0 +1,99 @@
+import os
+import shutil
+import resource
+import tempfile
+from time import time
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.core.management.base import BaseCommand
+from django.http.multipartparser import MultiPartParser
+from django.test import override_settings
+
+from sim import blobs
+from sim.models import Blob
+from sim.uploads import BlobUploadHandler
+
+BOUNDARY = 'benchuploadboundary'
+
+
+class UploadStream:
+    """ A multipart request body with one file of a given size, generated while it is read."""
+    def __init__(self, size):
+        self.parts = [
+            '--{0}\r\nContent-Disposition: form-data; name="file"; filename="input.bin"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'.format(BOUNDARY),
+            None,
+            '\r\n--{0}--\r\n'.format(BOUNDARY),
+        ]
+        self.size = size
+        self.length = len(self.parts[0]) + size + len(self.parts[2])
+        self.pattern = os.urandom(1024 * 1024)
+        self.position = 0
+
+    def read(self, count=-1):
+        if count < 0:
+            count = self.length - self.position
+        data = []
+        while count > 0 and self.position < self.length:
+            header = len(self.parts[0])
+            if self.position < header:
+                piece = self.parts[0][self.position:self.position + count]
+            elif self.position < header + self.size:
+                offset = (self.position - header) % len(self.pattern)
+                piece = self.pattern[offset:offset + min(count, header + self.size - self.position)]
+            else:
+                offset = self.position - header - self.size
+                piece = self.parts[2][offset:offset + count]
+            data.append(piece)
+            self.position += len(piece)
+            count -= len(piece)
+        return ''.join(data)
+
+
+def receive(size, handler):
+    stream = UploadStream(size)
+    meta = {
+        'CONTENT_TYPE': 'multipart/form-data; boundary=' + BOUNDARY,
+        'CONTENT_LENGTH': str(stream.length),
+    }
+    post, files = MultiPartParser(meta, stream, [handler]).parse()
+    return files['file']
+
+
+class Command(BaseCommand):
+    help = 'Measures receiving a large upload and adding it to the blob store.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=5 * 1024, help='Size of the uploaded file in MB')
+        parser.add_argument('--compare', action='store_true',
+                            help='Also measure an upload received by the default handler, then hashed and copied')
+
+    def handle(self, *args, **options):
+        size = options['size'] * 1024 * 1024
+        # a scratch store on the file system of the real one
+        directory = tempfile.mkdtemp(dir=os.path.dirname(blobs.BLOB_DIRECTORY))
+        blob_directory = blobs.BLOB_DIRECTORY
+        blobs.BLOB_DIRECTORY = directory
+        try:
+            with override_settings(FILE_UPLOAD_TEMP_DIR=os.path.join(directory, 'tmp')):
+                start = time()
+                file = receive(size, BlobUploadHandler())
+                self.stdout.write('Receiving and hashing: {0:.3f} s'.format(time() - start))
+                start = time()
+                digest = blobs.store_blob(file)
+                self.stdout.write('Storing: {0:.3f} s'.format(time() - start))
+                file.close()
+                Blob.objects.filter(digest=digest).delete()
+
+                if options['compare']:
+                    start = time()
+                    file = receive(size, TemporaryFileUploadHandler())
+                    self.stdout.write('Receiving with the default handler: {0:.3f} s'.format(time() - start))
+                    start = time()
+                    blobs.stream_to_temporary(file)
+                    file.close()
+                    self.stdout.write('Hashing and copying: {0:.3f} s'.format(time() - start))
+        finally:
+            blobs.BLOB_DIRECTORY = blob_directory
+            shutil.rmtree(directory)
+        self.stdout.write('Peak memory: {0} MB'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024))
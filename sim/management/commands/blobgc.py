@@ -0,0 +1,20 @@
+from htcondor import Schedd
+from django.core.management.base import BaseCommand
+
+from sim.blobs import collect_garbage
+from sim.spec_factory import release_jobs
+from sporeweb.settings import BLOB_GC_GRACE
+
+
+class Command(BaseCommand):
+    help = 'Releases files of finished and failed jobs, then deletes executables and input files ' \
+           'which are not used by any job from the blob store.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=BLOB_GC_GRACE,
+                            help='Seconds an unused file is kept after it was stored')
+
+    def handle(self, *args, **options):
+        jobs = release_jobs(Schedd())
+        count = collect_garbage(options['grace'])
+        self.stdout.write('Released files of {0} jobs, deleted {1} files'.format(jobs, count))
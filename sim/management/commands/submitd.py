@@ -0,0 +1,21 @@
+from time import sleep
+
+from htcondor import Schedd
+from django.core.management.base import BaseCommand
+
+from sim.spec_factory import resume_submissions
+
+
+class Command(BaseCommand):
+    help = 'Submits queued simulations to HTCondor, carrying on the ones interrupted by a crash.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait between checks for queued simulations')
+
+    def handle(self, *args, **options):
+        schedd = Schedd()
+        while True:
+            # submissions of workers which stopped renewing their leases are carried on as well
+            resume_submissions(schedd)
+            sleep(options['interval'])
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:16
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sim', '0006_auto_20171202_1728'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobidmodel',
+            name='parameters',
+            field=models.CharField(blank=True, max_length=300),
+        ),
+    ]
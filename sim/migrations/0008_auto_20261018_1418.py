@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sim', '0007_jobidmodel_parameters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcParameter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cluster_id', models.IntegerField()),
+                ('proc_id', models.IntegerField()),
+                ('name', models.CharField(max_length=50)),
+                ('value', models.CharField(max_length=300)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='procparameter',
+            unique_together=set([('cluster_id', 'proc_id', 'name')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='procparameter',
+            index_together=set([('cluster_id', 'name', 'value')]),
+        ),
+    ]
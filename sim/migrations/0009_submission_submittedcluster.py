@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sim', '0008_auto_20261018_1418'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('job_name', models.CharField(max_length=300, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[(b'q', b'Queued'), (b's', b'Submitting'), (b'd', b'Done'), (b'f', b'Failed')], default=b'q', max_length=1)),
+                ('template', models.CharField(blank=True, max_length=300)),
+                ('values', models.TextField()),
+                ('base_ad', models.TextField()),
+                ('total', models.BigIntegerField(default=0)),
+                ('submitted', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SubmittedCluster',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_name', models.CharField(db_index=True, max_length=300)),
+                ('cluster_id', models.IntegerField(unique=True)),
+                ('first_proc', models.BigIntegerField()),
+                ('count', models.IntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:23
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sim', '0009_submission_submittedcluster'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('stored', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_name', models.CharField(db_index=True, max_length=300)),
+                ('name', models.CharField(max_length=300)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='sim.Blob')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='jobfile',
+            unique_together=set([('job_name', 'name')]),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:28
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def register_jobs(apps, schema_editor):
+    """ Taking names of all jobs submitted so far, running and finished ones."""
+    Job = apps.get_model('sim', 'Job')
+    names = set(apps.get_model('sim', 'JobIdModel').objects.values_list('job_name', flat=True))
+    names.update(apps.get_model('logs', 'FinishedJobs').objects.values_list('job_name', flat=True))
+    Job.objects.bulk_create([Job(job_name=name) for name in sorted(names)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sim', '0011_auto_20261018_1426'),
+        ('logs', '0009_auto_20261018_1426'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('job_name', models.CharField(max_length=300, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(register_jobs, migrations.RunPython.noop),
+    ]
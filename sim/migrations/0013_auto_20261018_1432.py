@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:32
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def move_jobs(apps, schema_editor):
+    """ Copying running jobs from JobIdModel and finished ones from logs.FinishedJobs,
+    statuses of their submissions and loads tell the status of a running one."""
+    Job = apps.get_model('sim', 'Job')
+    submissions = dict((submission.job_name, submission) for submission in
+                       apps.get_model('sim', 'Submission').objects.all())
+    ingests = dict((ingest.job_name, ingest) for ingest in apps.get_model('logs', 'JobIngest').objects.all())
+    for job in apps.get_model('sim', 'JobIdModel').objects.all():
+        submission = submissions.get(job.job_name)
+        ingest = ingests.get(job.job_name)
+        error = ''
+        if ingest is not None and ingest.status == 'f':
+            status, error = 'f', ingest.error
+        elif submission is not None and submission.status == 'f':
+            status, error = 'f', submission.error
+        elif submission is not None and submission.status != 'd':
+            status = 's'
+        elif ingest is not None and ingest.status in ('q', 'r'):
+            status = 'i'
+        else:
+            status = 'r' if job.has_out else 'q'
+        Job.objects.filter(job_name=job.job_name).update(
+            status=status, cluster_id=job.cluster_id, parameters=job.parameters, has_out=job.has_out,
+            rows=ingest.rows if ingest is not None else 0, error=error)
+    for job in apps.get_model('logs', 'FinishedJobs').objects.all():
+        ingest = ingests.get(job.job_name)
+        Job.objects.filter(job_name=job.job_name).update(
+            status='d', cluster_id=job.cluster_id, has_out=job.has_out,
+            rows=ingest.rows if ingest is not None else 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sim', '0012_job'),
+        ('logs', '0009_auto_20261018_1426'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='cluster_id',
+            field=models.IntegerField(default=-1),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='finished',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='has_out',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='parameters',
+            field=models.CharField(blank=True, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='rows',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='status',
+            field=models.CharField(choices=[(b's', b'Submitting'), (b'q', b'Queued'), (b'r', b'Running'), (b'i', b'Ingesting'), (b'd', b'Finished'), (b'f', b'Failed')], db_index=True, default=b's', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together=set([('has_out', 'job_name')]),
+        ),
+        migrations.RunPython(move_jobs, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='JobIdModel',
+        ),
+    ]
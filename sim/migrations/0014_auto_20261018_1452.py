@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.5 on 2026-10-18 11:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sim', '0013_auto_20261018_1432'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='leased',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='worker',
+            field=models.CharField(blank=True, max_length=300),
+        ),
+    ]
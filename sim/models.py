@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class Configuration(models.Model):
     """ Model of a saved configuration """
@@ -24,9 +25,120 @@ class Argument(models.Model):
         return self.name
 
 
-class JobIdModel(models.Model):
-    """ This model stores created cluster_ids for further use."""
-    job_name = models.CharField(max_length=300, primary_key=True, default='null')
+class Job(models.Model):
+    """ A submitted job through its whole life, from submitting its procs to loading their results.
+    Names of running and finished jobs are all here, so any lookup of a job is one query of an index.
+    The status is only changed by transition, so a job is never moved twice by concurrent workers."""
+    STATUS_CHOICE = (
+        ('s', 'Submitting'),
+        ('q', 'Queued'),
+        ('r', 'Running'),
+        ('i', 'Ingesting'),
+        ('d', 'Finished'),
+        ('f', 'Failed'),
+    )
+    job_name = models.CharField(max_length=300, primary_key=True)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICE, default='s', db_index=True)
+    cluster_id = models.IntegerField(default=-1)    # the first cluster, -1 until it is submitted
+    parameters = models.CharField(max_length=300, blank=True)   # names of the template, separated by spaces
+    has_out = models.BooleanField(default=False)    # the out file was created, set by logs.daemon
+    rows = models.BigIntegerField(default=0)    # result rows loaded so far
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    updated = models.DateTimeField(auto_now=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # the logs landing page lists jobs with an out file by status, in name order
+        index_together = ('has_out', 'status', 'job_name')
+
+    @classmethod
+    def transition(cls, job_name, sources, status, **fields):
+        """
+        Moving a job to a new status in one conditional UPDATE.
+        :param sources: statuses the job may be moved from
+        :param fields: other fields to set together with the status
+        :return: True if the job was in one of sources and has been moved
+        """
+        now = timezone.now()
+        if status in ('d', 'f'):
+            fields.setdefault('finished', now)
+        return cls.objects.filter(job_name=job_name, status__in=sources)\
+            .update(status=status, updated=now, **fields) == 1
+
+    def __unicode__(self):
+        return self.job_name
+
+
+class ProcParameter(models.Model):
+    """ A value of a template name a proc of a cluster was submitted with."""
     cluster_id = models.IntegerField()
+    proc_id = models.IntegerField()
+    name = models.CharField(max_length=50)
+    value = models.CharField(max_length=300)
+
+    class Meta:
+        unique_together = ('cluster_id', 'proc_id', 'name')
+        index_together = ('cluster_id', 'name', 'value')
+
+    def __unicode__(self):
+        return '{0}.{1} {2}={3}'.format(self.cluster_id, self.proc_id, self.name, self.value)
+
+
+class Submission(models.Model):
+    """ Progress of submitting the procs of a job to HTCondor in clusters of bounded size,
+    with everything needed to carry on after a crash (see sim.spec_factory.submit)."""
+    STATUS_CHOICE = (
+        ('q', 'Queued'),
+        ('s', 'Submitting'),
+        ('d', 'Done'),
+        ('f', 'Failed'),
+    )
+    job_name = models.CharField(max_length=300, primary_key=True)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICE, default='q')
+    template = models.CharField(max_length=300, blank=True)
+    values = models.TextField()     # JSON list of value lists of the template names
+    base_ad = models.TextField()    # the cluster ClassAd shared by all procs
+    total = models.BigIntegerField(default=0)
+    submitted = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    updated = models.DateTimeField(auto_now=True)
+    worker = models.CharField(max_length=300, blank=True)   # the worker holding the lease, see sim.spec_factory
+    leased = models.DateTimeField(null=True, blank=True)    # when the worker last renewed its lease
+
     def __unicode__(self):
         return self.job_name
+
+
+class SubmittedCluster(models.Model):
+    """ A cluster holding the procs first_proc .. first_proc + count - 1 of a job."""
+    job_name = models.CharField(max_length=300, db_index=True)
+    cluster_id = models.IntegerField(unique=True)
+    first_proc = models.BigIntegerField()
+    count = models.IntegerField()
+
+    def __unicode__(self):
+        return '{0} {1}'.format(self.job_name, self.cluster_id)
+
+
+class Blob(models.Model):
+    """ A file in the content-addressed store shared by all jobs (see sim.blobs)."""
+    digest = models.CharField(max_length=64, primary_key=True)     # SHA-256 of the content
+    size = models.BigIntegerField()
+    stored = models.DateTimeField(default=timezone.now)
+
+    def __unicode__(self):
+        return self.digest
+
+
+class JobFile(models.Model):
+    """ A reference of a job to a stored file, which is linked into the job directory under a name."""
+    job_name = models.CharField(max_length=300, db_index=True)
+    name = models.CharField(max_length=300)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT)
+
+    class Meta:
+        unique_together = ('job_name', 'name')
+
+    def __unicode__(self):
+        return '{0}/{1}'.format(self.job_name, self.name)
@@ -2,22 +2,28 @@ import htcondor
 import classad
 import re
 import os
+import json
+import socket
 
-from itertools import product
-from sim.models import JobIdModel
-from django.db import IntegrityError
-
-
-def save_file(file, dest):
-    """ Saving Django file in specified destination """
-    with open(os.path.join(dest, file.name), 'wb+') as destination:
-        for chunk in file.chunks():
-            destination.write(chunk)
+from itertools import product, islice, chain, repeat
+from operator import mul
+from time import sleep
+from datetime import timedelta
+from sim.models import Job, ProcParameter, Submission, SubmittedCluster, JobFile
+from sim.blobs import add_file, release_job
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from sporeweb.settings import SUBMIT_CLUSTER_SIZE, SUBMIT_MAX_IDLE, SUBMIT_POLL_INTERVAL, SUBMIT_LEASE_TIMEOUT
 
 
 class JobNameDuplicateError(Exception):
     pass
 
+class SubmissionLeaseError(Exception):
+    """ Raised when a submission is being submitted by another worker."""
+    pass
+
 class Name:
     """ A class for pairs <name : values>, where 'name' - name of a argument template argument,
     'values' - list of all possible string values for this name."""
@@ -39,6 +45,7 @@ class SpecFactory:
         :param template: string of argument template, with names matching r'{\w+}
         """
         regex_name = r'{\w+}'
+        self.__template = template
         self.__template_buff = re.split(regex_name, template)
         names = re.findall(regex_name, template)
         for i in range(len(names)):
@@ -47,6 +54,9 @@ class SpecFactory:
         self.__names = [Name(name, []) for name in names]
         self.__specs = []
 
+    def get_template(self):
+        return self.__template
+
     def get_names(self):
         return self.__names
 
@@ -112,22 +122,65 @@ class SpecFactory:
             if self.__names[i].name in name_vals.keys():
                 self.__names[i].values = name_vals[self.__names[i].name]
 
-    def get_combinations(self):
+    def get_value_combinations(self, start=0):
+        """
+        Lazily getting all possible combinations of stored names' values.
+        Skipped combinations are not enumerated: the first one is found by writing start
+        in the mixed radix of the numbers of values, the last name being the lowest digit.
+        :param start: number of combinations to skip
+        :return: An iterator over tuples of values, in names' appearance order
+        """
+        values = [name.values for name in self.__names]
+        digits = []
+        for name_values in reversed(values):
+            if len(name_values) == 0:
+                return iter([])
+            start, digit = divmod(start, len(name_values))
+            digits.insert(0, digit)
+        if start > 0:
+            return iter([])
+        if len(values) == 0:
+            return product()
+        # the first combination and the ones after it, grouped by the first name whose value differs from it
+        fixed = [[name_values[digit]] for name_values, digit in zip(values, digits)]
+        last = len(values) - 1
+        return chain.from_iterable(
+            product(*(fixed[:i] + [values[i][digits[i] + (i < last):]] + values[i + 1:]))
+            for i in reversed(range(len(values))))
+
+    def count(self):
+        """
+        Getting the number of combinations without enumerating them.
+        :return: Product of the numbers of values of all names
+        """
+        return reduce(mul, [len(name.values) for name in self.__names], 1)
+
+    def get_combinations(self, start=0):
+        """
+        Lazily getting all possible combination of argument strings, using stored names' values.
+        :param start: number of combinations to skip
+        :return: An iterator over argument strings
+        """
+        template = '{}'.join(part.replace('{', '{{').replace('}', '}}') for part in self.__template_buff)
+        return (template.format(*combo) for combo in self.get_value_combinations(start))
+
+    def record_parameters(self, cluster_id, combinations, first_proc=0):
         """
-        Getting all possible combination of argument strings, using stored names' values.
-        :return: A list of all possible argument strings
+        Storing values every proc of a job was submitted with in sim.models.ProcParameter,
+        so that results can be matched with them.
+        :param cluster_id: the first cluster of the job
+        :param combinations: tuples of values, as returned by get_value_combinations, in proc order
+        :param first_proc: number of the first proc in the whole sweep
         """
-        if len(self.__names) == 0:
-            combos = [[]]
-        else:
-            combos = [list(x) for x in self.__names[0].values]
-            for i in range(1, len(self.__names)):
-                combos = list(product(combos, self.__names[i].values))
-                for j in range(0, len(combos)):
-                    combos[j] = combos[j][0] + [combos[j][1]]
-        for i in range(0, len(combos)):
-            combos[i] = self.join_comb(combos[i])
-        return combos
+        # a name used several times in the template is recorded with its first value
+        names = [(i, name.name) for i, name in enumerate(self.__names)
+                 if name.name not in [n.name for n in self.__names[:i]]]
+        entries = (ProcParameter(cluster_id=cluster_id, proc_id=proc_id, name=name, value=combo[i])
+                   for proc_id, combo in enumerate(combinations, first_proc) for i, name in names)
+        batch = list(islice(entries, 1000))
+        while batch:
+            ProcParameter.objects.bulk_create(batch)
+            batch = list(islice(entries, 1000))
 
     def join_comb(self, name_vals):
         """
@@ -141,31 +194,32 @@ class SpecFactory:
         ans += self.__template_buff[-1]
         return ans
 
-    def run_specs(self, exec_data, value_data, file_data):
+    def queue_specs(self, exec_data, value_data, file_data):
         """
-        Launching HTCondor jobs with provided executable, name values and files.
-        Storing local ID for a launch and created Cluster ID in sim.models.JobIdModel.
+        Preparing HTCondor jobs with provided executable, name values and files to be submitted
+        by a background worker (see sim.management.commands.submitd).
+        Storing the job in sim.models.Job, everything needed to submit procs in sim.models.Submission.
         :param exec_data: a dictionary representation of sim.forms.JobForm
         :param value_data: a dictionary representation of sim.forms.ValueForm
         :param file_data: a dictionary representation of sim.forms.FileForm
-        :return: Cluster ID of a newly created job
+        :return: sim.models.Submission of the job
         """
-        # Getting new ID entry
+        # Taking the name, the unique index settles concurrent submits of the same one
         try:
-            job_entry = JobIdModel(exec_data['job_name'], cluster_id=-1)
+            with transaction.atomic():
+                Job.objects.create(job_name=exec_data['job_name'])
         except IntegrityError:
             raise JobNameDuplicateError('This job name already exist!')
-        job_entry.save()
 
-        # Making working directory and changing location to it
-        os.makedirs(os.path.join(os.path.abspath(os.path.dirname(__file__)), exec_data['job_name']))
-        os.chdir(os.path.join(os.path.abspath(os.path.dirname(__file__)), exec_data['job_name']))
+        # Making working directory, the current one is shared by all threads and is not changed
+        job_dir = job_directory(exec_data['job_name'])
+        os.makedirs(job_dir)
 
-        # Storing files in directory
-        save_file(exec_data['exec_file'], os.getcwd())
+        # Storing files once in the blob store and linking them into directory
+        add_file(exec_data['job_name'], exec_data['exec_file'], job_dir)
         input_files_names = ''
         for file in file_data:
-            save_file(file['file'], os.getcwd())
+            add_file(exec_data['job_name'], file['file'], job_dir)
             input_files_names = input_files_names + file['file'].name + ', '
 
         # Preparing specs
@@ -174,31 +228,223 @@ class SpecFactory:
 
         # Creating a base ClassAd for all jobs
         base_ad = classad.ClassAd({
-            'Cmd': (os.getcwd() + '/' + exec_name).encode('utf-8'),
-            'Out': 'out',
-            'Err': 'err',
-            'UserLog': (os.getcwd() + '/log').encode('utf-8'),
+            'Cmd': (job_dir + '/' + exec_name).encode('utf-8'),
+            'UserLog': (job_dir + '/log').encode('utf-8'),
             'TransferInput': input_files_names.encode('utf-8'),
-            'Iwd': os.getcwd().encode('utf-8')
+            'Iwd': job_dir.encode('utf-8')
         })
 
-        # Process data and getting all possible args
+        # Process data and storing everything needed to submit procs for all args
         self.eval_values(value_data, file_data)
-        args = self.get_combinations()
+        submission = Submission(job_name=exec_data['job_name'], template=self.__template,
+                                values=json.dumps([name.values for name in self.__names]),
+                                base_ad=str(base_ad), total=self.count() or 1)
+        submission.save()
+        Job.objects.filter(job_name=exec_data['job_name']).update(
+            parameters=' '.join(name.name for name in self.__names))
+        return submission
+
+    def run_specs(self, exec_data, value_data, file_data):
+        """
+        Launching HTCondor jobs with provided executable, name values and files right away.
+        :return: Cluster ID of the first cluster of a newly created job
+        """
+        submission = self.queue_specs(exec_data, value_data, file_data)
+        # Sending jobs to local condor_schedd by clusters of bounded size
+        return submit(submission, htcondor.Schedd())
+
+
+def job_directory(job_name):
+    """ Directory the executable and input files of a job are linked into, and its procs run in."""
+    return os.path.join(os.path.abspath(os.path.dirname(__file__)), job_name)
 
-        # Making ads for each arg
-        proc_ads = []
-        for arg in args:
-            proc_ads.append((classad.ClassAd({'Arguments': arg.encode('utf-8')}), 1))
 
-        if len(proc_ads) == 0:
-            proc_ads = [(classad.ClassAd({'Arguments': ''}), 1)]
+def restore_factory(submission):
+    """ Making a SpecFactory with the template and values a submission was created with."""
+    factory = SpecFactory(submission.template)
+    for name, values in zip(factory.get_names(), json.loads(submission.values)):
+        name.values = values
+    return factory
+
+
+def cluster_constraint(job_name, first_proc):
+    """ Making a ClassAd constraint matching the cluster of a job starting with a given proc."""
+    return 'SporeJob == {0} && SporeFirstProc == {1}'.format(json.dumps(job_name), first_proc)
+
+
+def find_cluster(schedd, job_name, first_proc):
+    """
+    Looking for a cluster which was submitted, but not recorded before a crash,
+    in the queue and then, if it has already left the queue, in the history.
+    :return: Cluster ID or None
+    """
+    constraint = cluster_constraint(job_name, first_proc)
+    for ad in schedd.query(constraint, ['ClusterId'], None, 1):
+        return ad['ClusterId']
+    for ad in schedd.history(constraint, ['ClusterId'], 1):
+        return ad['ClusterId']
+    return None
+
 
-        # Sending jobs to local condor_schedd
-        schedd = htcondor.Schedd()
-        cluster_id = schedd.submitMany(base_ad, proc_ads, spool=False)
+def job_in_queue(schedd, job_name):
+    """ Checking whether any proc of a job is still in the queue, i.e. idle, running or held."""
+    return len(schedd.query('SporeJob == {0}'.format(json.dumps(job_name)), ['ProcId'], None, 1)) > 0
 
-        job_entry.cluster_id = cluster_id
-        job_entry.save()
 
-        return cluster_id
+def worker_id():
+    """ Name of the current process, unique among all workers submitting jobs."""
+    return '{0}:{1}'.format(socket.gethostname(), os.getpid())
+
+
+def claim_submission(submission):
+    """
+    Taking a lease on a submission, in one conditional UPDATE. A queued submission is taken by one worker only;
+    a submission which is being submitted is taken over only if its worker has not renewed the lease
+    for SUBMIT_LEASE_TIMEOUT seconds, i.e. it is not alive anymore, or if it is the current worker.
+    :return: Status the submission was claimed in, 'q' for a queued one or 's' for one which is carried on,
+             None if it is leased by another worker
+    """
+    now = timezone.now()
+    worker = worker_id()
+    stale = Q(leased__isnull=True) | Q(leased__lt=now - timedelta(seconds=SUBMIT_LEASE_TIMEOUT)) | Q(worker=worker)
+    for status, condition in (('q', Q()), ('s', stale)):
+        if Submission.objects.filter(condition, status=status, job_name=submission.job_name)\
+                .update(status='s', worker=worker, leased=now) > 0:
+            submission.status = 's'
+            submission.worker = worker
+            submission.leased = now
+            return status
+    return None
+
+
+def renew_lease(submission):
+    """
+    Renewing the lease of the current worker on a submission.
+    :raise SubmissionLeaseError: if the submission has been taken over by another worker
+    """
+    now = timezone.now()
+    if Submission.objects.filter(job_name=submission.job_name, status='s', worker=submission.worker)\
+            .update(leased=now) == 0:
+        raise SubmissionLeaseError('{0} has been taken over by another worker'.format(submission.job_name))
+    submission.leased = now
+
+
+def update_submission(submission, **fields):
+    """
+    Storing fields of a submission leased by the current worker, in one conditional UPDATE,
+    so that a worker which lost its lease never overwrites progress stored by the one which took over.
+    :raise SubmissionLeaseError: if the submission has been taken over by another worker
+    """
+    fields['updated'] = timezone.now()
+    if Submission.objects.filter(job_name=submission.job_name, worker=submission.worker).update(**fields) == 0:
+        raise SubmissionLeaseError('{0} has been taken over by another worker'.format(submission.job_name))
+    for name, value in fields.items():
+        setattr(submission, name, value)
+
+
+def wait_for_queue(schedd, submission, wait=sleep):
+    """ Waiting until fewer than SUBMIT_MAX_IDLE procs of a job are idle in the queue, keeping the lease on it."""
+    constraint = 'SporeJob == {0} && JobStatus == 1'.format(json.dumps(submission.job_name))
+    while len(schedd.query(constraint, ['ProcId'])) >= SUBMIT_MAX_IDLE:
+        wait(SUBMIT_POLL_INTERVAL)
+        renew_lease(submission)
+
+
+def submit(submission, schedd, wait=sleep):
+    """
+    Submitting procs of a job which have not been submitted yet, SUBMIT_CLUSTER_SIZE procs in a cluster.
+    Before every cluster the queue is let drain below SUBMIT_MAX_IDLE idle procs of the job.
+    Progress is stored after every cluster, and every cluster is marked with the job name
+    and its first proc, so a submission interrupted at any point can be carried on by calling this again;
+    the first cluster of a submission carried on is looked up in HTCondor before it is submitted.
+    Once all procs are submitted the job is queued, if submitting fails the job fails.
+    The submission is leased by the current worker (see claim_submission), the lease is renewed
+    before every cluster is looked up and right before it is submitted, and progress is stored only
+    while the lease is held (see update_submission), so a job is never submitted by two live workers at once.
+    :param submission: sim.models.Submission of the job
+    :param schedd: htcondor.Schedd to submit to
+    :param wait: a function waiting for a given number of seconds
+    :return: Cluster ID of the first cluster of the job
+    :raise SubmissionLeaseError: if the submission is leased by another worker
+    """
+    claimed = claim_submission(submission)
+    if claimed is None:
+        raise SubmissionLeaseError('{0} is being submitted by another worker'.format(submission.job_name))
+    factory = restore_factory(submission)
+    job = Job.objects.get(job_name=submission.job_name)
+    # only the first cluster of a submission which is carried on may have been submitted without being recorded
+    resumed = claimed == 's'
+    try:
+        while submission.submitted < submission.total:
+            renew_lease(submission)
+            first = submission.submitted
+            count = min(SUBMIT_CLUSTER_SIZE, submission.total - first)
+            cluster_id = find_cluster(schedd, submission.job_name, first) if resumed else None
+            resumed = False
+            if cluster_id is None:
+                wait_for_queue(schedd, submission, wait)
+                cluster_ad = classad.ClassAd(submission.base_ad.encode('utf-8'))
+                cluster_ad['SporeJob'] = submission.job_name.encode('utf-8')
+                cluster_ad['SporeFirstProc'] = first
+                # a sweep without any combination is submitted as a single proc without arguments
+                args = islice(chain(factory.get_combinations(first), repeat('')), count)
+                # every proc writes its own out.<n> and err.<n>, numbered through all clusters of the job
+                proc_ads = [(classad.ClassAd({'Arguments': arg.encode('utf-8'),
+                                              'Out': 'out.{0}'.format(first + i),
+                                              'Err': 'err.{0}'.format(first + i)}), 1)
+                            for i, arg in enumerate(args)]
+                renew_lease(submission)
+                cluster_id = schedd.submitMany(cluster_ad, proc_ads, spool=False)
+            with transaction.atomic():
+                SubmittedCluster(job_name=submission.job_name, cluster_id=cluster_id,
+                                 first_proc=first, count=count).save()
+                if job.cluster_id < 0:
+                    job.cluster_id = cluster_id
+                    Job.objects.filter(job_name=job.job_name).update(cluster_id=cluster_id)
+                factory.record_parameters(job.cluster_id, islice(factory.get_value_combinations(first), count), first)
+                update_submission(submission, submitted=first + count)
+    except SubmissionLeaseError:
+        raise
+    except Exception as e:
+        with transaction.atomic():
+            update_submission(submission, status='f', error=repr(e))
+            Job.transition(job.job_name, ['s'], 'f', error=submission.error)
+        raise
+    with transaction.atomic():
+        update_submission(submission, status='d')
+        Job.transition(job.job_name, ['s'], 'q')
+    return job.cluster_id
+
+
+def resume_submissions(schedd, wait=sleep, interrupted=True):
+    """
+    Submitting queued jobs in the order they were queued.
+    Every submission is claimed with a lease first (see claim_submission), so a submission is
+    taken by one worker only, even if several of them are running.
+    :param interrupted: True to also carry on submissions whose worker stopped renewing its lease,
+                        e.g. because it crashed
+    """
+    statuses = ['q', 's'] if interrupted else ['q']
+    for submission in Submission.objects.filter(status__in=statuses).order_by('updated'):
+        try:
+            submit(submission, schedd, wait)
+        except Exception:
+            pass    # the error is stored in the submission, or another worker has it; the others are carried on
+
+
+def release_jobs(schedd):
+    """
+    Dropping references of finished and failed jobs to their executables and input files (see sim.blobs.release_job),
+    so that sim.blobs.collect_garbage deletes the files no job uses anymore.
+    A job is released only once none of its procs is left in the queue, e.g. procs of a job whose submission failed.
+    :param schedd: htcondor.Schedd the jobs were submitted to
+    :return: Number of released jobs
+    """
+    ended = Job.objects.filter(status__in=['d', 'f']).values('job_name')
+    count = 0
+    for job_name in JobFile.objects.filter(job_name__in=ended).values_list('job_name', flat=True).distinct():
+        if job_in_queue(schedd, job_name):
+            continue
+        release_job(job_name, job_directory(job_name))
+        count += 1
+    return count
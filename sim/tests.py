@@ -1,12 +1,22 @@
 import htcondor
+import classad
+import json
+import hashlib
 import os
+import shutil
+import tempfile
 
 from time import sleep
+from datetime import timedelta
 from django.test import TestCase, Client
-from sim.spec_factory import SpecFactory
-from sim.forms import ValueForm
-from django.core.files.uploadedfile import UploadedFile
-from sim.models import JobIdModel
+from sim import spec_factory, blobs
+from sim.blobs import add_file, release_job, collect_garbage, blob_path
+from sim.spec_factory import SpecFactory, submit, resume_submissions, worker_id, job_directory, release_jobs, \
+    JobNameDuplicateError, SubmissionLeaseError
+from sim.forms import ValueForm, JobForm
+from django.core.files.uploadedfile import UploadedFile, SimpleUploadedFile
+from django.utils import timezone
+from sim.models import Job, ProcParameter, Submission, SubmittedCluster, Blob, JobFile
 
 
 class SpecFactoryParserTest(TestCase):
@@ -112,12 +122,69 @@ class SpecFactoryParserTest(TestCase):
         ]
 
         factory.eval_values(value_data, file_data)
-        combs = factory.get_combinations()
+        combs = list(factory.get_combinations())
+        self.assertEqual(factory.count(), 8)
         self.assertEqual(len(combs), 8, msg='Invalid number of combinations; expected 8, got ' + str(len(combs)) +
                                             ' combs:' + str(combs))
         for comb in combs:
             self.assertTrue(comb in correct_combs, msg='Incorrect comb: ' + comb)
 
+    def test_combinations_are_lazy(self):
+        factory = SpecFactory('-x {x} -y {y} -z {not a name}')
+        factory.eval_values([
+            {'type': 'r', 'name': 'x', 'args': '0, 1000, 1'},
+            {'type': 'r', 'name': 'y', 'args': '0, 1000, 1'},
+        ], [])
+        self.assertEqual(factory.count(), 1000000)
+        combs = factory.get_combinations()
+        self.assertEqual(next(combs), '-x 0 -y 0 -z {not a name}')
+        self.assertEqual(next(combs), '-x 0 -y 1 -z {not a name}')
+        self.assertEqual(list(SpecFactory('no names').get_combinations()), ['no names'])
+
+    def test_combinations_start_anywhere(self):
+        factory = SpecFactory('-x {x} -y {y} -z {z}')
+        factory.eval_values([
+            {'type': 'v', 'name': 'x', 'args': 'a, b'},
+            {'type': 'r', 'name': 'y', 'args': '0, 3, 1'},
+            {'type': 'v', 'name': 'z', 'args': 'p, q, r, s'},
+        ], [])
+        combos = list(factory.get_value_combinations())
+        self.assertEqual(len(combos), 24)
+        for start in range(26):
+            self.assertEqual(list(factory.get_value_combinations(start)), combos[start:])
+        self.assertEqual(next(factory.get_combinations(13)), '-x b -y 0 -z q')
+        self.assertEqual(list(SpecFactory('no names').get_combinations(1)), [])
+
+        factory = SpecFactory('-x {x} -y {y}')
+        factory.eval_values([{'type': 'r', 'name': 'x', 'args': '0, 1000, 1'},
+                             {'type': 'r', 'name': 'y', 'args': '0, 1000000, 1'}], [])
+        self.assertEqual(next(factory.get_combinations(999999999)), '-x 999 -y 999999')
+
+    def test_can_record_parameters(self):
+        factory = SpecFactory('-snr {snr} -code {code}')
+        value_data = [
+            {
+                'type': 'r',
+                'name': 'snr',
+                'args': '10, 13, 1',
+            },
+            {
+                'type': 'v',
+                'name': 'code',
+                'args': 'ldpc, polar',
+            }
+        ]
+        factory.eval_values(value_data, [])
+        combos = list(factory.get_value_combinations())
+        self.assertEqual(factory.count(), 6)
+        self.assertEqual(next(factory.get_combinations()), '-snr 10 -code ldpc')
+
+        factory.record_parameters(7, combos)
+        self.assertEqual(ProcParameter.objects.filter(cluster_id=7).count(), 12)
+        for proc_id, combo in enumerate(combos):
+            values = dict(ProcParameter.objects.filter(cluster_id=7, proc_id=proc_id).values_list('name', 'value'))
+            self.assertEqual(values, {'snr': combo[0], 'code': combo[1]})
+
     def test_can_submit_job(self):
         template = '{asdf}-c{first}-{second} {123third}'
         factory = SpecFactory(template)
@@ -170,7 +237,7 @@ class SpecFactoryParserTest(TestCase):
         # Waiting for jobs to end
         sleep(30)
         # Looking for local job id in cache
-        job_name = JobIdModel.objects.get(cluster_id=cluster_id).job_name
+        job_name = Job.objects.get(cluster_id=cluster_id).job_name
 
         self.assertFalse(job_name is None, msg='Job with cluster_id= '+str(cluster_id) + ' is not in cache')
         # Checking through history for our job
@@ -232,11 +299,13 @@ class SpecFactoryParserTest(TestCase):
         ]
 
         response = c.post('/sim/', post_data)
+        # Submitting the queued job as sim.management.commands.submitd does
+        resume_submissions(htcondor.Schedd())
 
         exec_file.close()
         input_file.close()
         sleep(30)
-        job_id = JobIdModel.objects.get(job_name='testview')
+        job_id = Job.objects.get(job_name='testview')
         self.assertEqual(job_id.job_name, 'testview',
                          msg='Name of the job is invalid; expected \'testview\', got \'' + job_id.job_name + '\'')
         schedd = htcondor.Schedd()
@@ -275,3 +344,272 @@ class FormTest(TestCase):
         })
         self.assertTrue(form.is_valid())
 
+    def test_jobform_rejects_taken_names(self):
+        Job.objects.create(job_name='test_taken', status='d')
+        for name, valid in (('test_taken', False), ('test_free', True)):
+            form = JobForm({'job_name': name},
+                           {'exec_file': SimpleUploadedFile('helloworld', b'#!/bin/sh')})
+            self.assertEqual(form.is_valid(), valid)
+        self.assertEqual(form.cleaned_data['job_name'], 'test_free')
+        self.assertRaises(JobNameDuplicateError, SpecFactory('-x {x}').queue_specs,
+                          {'job_name': 'test_taken'}, [], [])
+
+
+class FakeSchedd:
+    """ A stand-in for htcondor.Schedd keeping submitted procs in memory, all of them idle."""
+    def __init__(self, fail_after=None):
+        self.procs = []
+        self.clusters = 0
+        self.fail_after = fail_after
+        self.waits = 0
+        self.histories = 0
+
+    def submitMany(self, cluster_ad, proc_ads, spool=False):
+        if self.fail_after is not None and self.clusters >= self.fail_after:
+            raise RuntimeError('Failed to submit')
+        self.clusters += 1
+        for proc_id, (proc_ad, count) in enumerate(proc_ads):
+            ad = classad.ClassAd(str(cluster_ad))
+            ad.update(proc_ad)
+            ad.update({'ClusterId': self.clusters, 'ProcId': proc_id, 'JobStatus': 1})
+            self.procs.append(ad)
+        return self.clusters
+
+    def query(self, constraint, projection, callback=None, limit=-1):
+        ads = [ad for ad in self.procs if classad.ExprTree(constraint).eval(ad)]
+        return ads[:limit] if limit >= 0 else ads
+
+    def history(self, constraint, projection, match):
+        self.histories += 1
+        return []
+
+    def wait(self, seconds):
+        """ Letting all idle procs run."""
+        self.waits += 1
+        for ad in self.procs:
+            ad['JobStatus'] = 2
+
+
+class SubmissionTest(TestCase):
+    def setUp(self):
+        self.cluster_size = spec_factory.SUBMIT_CLUSTER_SIZE
+        self.max_idle = spec_factory.SUBMIT_MAX_IDLE
+        spec_factory.SUBMIT_CLUSTER_SIZE = 10
+        spec_factory.SUBMIT_MAX_IDLE = 20
+
+    def tearDown(self):
+        spec_factory.SUBMIT_CLUSTER_SIZE = self.cluster_size
+        spec_factory.SUBMIT_MAX_IDLE = self.max_idle
+
+    def add_submission(self, name):
+        Job(job_name=name, parameters='x').save()
+        submission = Submission(job_name=name, template='-x {x}', values=json.dumps([[str(i) for i in range(25)]]),
+                                base_ad=str(classad.ClassAd({'Cmd': '/bin/true'})), total=25)
+        submission.save()
+        return submission
+
+    def test_procs_are_submitted_by_clusters(self):
+        submission = self.add_submission('test_chunks')
+        schedd = FakeSchedd()
+
+        self.assertEqual(submit(submission, schedd, schedd.wait), 1)
+
+        self.assertEqual(schedd.clusters, 3)
+        self.assertEqual(schedd.waits, 1)
+        # clusters of a new submission are not looked up
+        self.assertEqual(schedd.histories, 0)
+        self.assertEqual([ad['Arguments'] for ad in schedd.procs], ['-x ' + str(i) for i in range(25)])
+        # procs are numbered through all clusters, so their out files never collide
+        self.assertEqual([ad['Out'] for ad in schedd.procs], ['out.' + str(i) for i in range(25)])
+        self.assertEqual(list(SubmittedCluster.objects.order_by('cluster_id').values_list('first_proc', 'count')),
+                         [(0, 10), (10, 10), (20, 5)])
+        self.assertEqual(Submission.objects.get(job_name='test_chunks').status, 'd')
+        self.assertEqual(Job.objects.get(job_name='test_chunks').cluster_id, 1)
+        self.assertEqual(Job.objects.get(job_name='test_chunks').status, 'q')
+        self.assertEqual(ProcParameter.objects.get(cluster_id=1, proc_id=23).value, '23')
+
+    def test_submission_is_resumed(self):
+        self.add_submission('test_resume')
+        schedd = FakeSchedd(fail_after=2)
+        with self.assertRaises(RuntimeError):
+            submit(Submission.objects.get(job_name='test_resume'), schedd, schedd.wait)
+        self.assertEqual(Submission.objects.get(job_name='test_resume').status, 'f')
+        self.assertEqual(Submission.objects.get(job_name='test_resume').submitted, 20)
+        self.assertEqual(Job.objects.get(job_name='test_resume').status, 'f')
+
+        # the second cluster was submitted, but its progress was lost in a crash
+        SubmittedCluster.objects.filter(cluster_id=2).delete()
+        ProcParameter.objects.filter(proc_id__gte=10).delete()
+        Submission.objects.filter(job_name='test_resume').update(status='s', submitted=10)
+        Job.objects.filter(job_name='test_resume').update(status='s', error='')
+        schedd.fail_after = None
+        resume_submissions(schedd, schedd.wait)
+
+        self.assertEqual(Submission.objects.get(job_name='test_resume').status, 'd')
+        self.assertEqual(Job.objects.get(job_name='test_resume').status, 'q')
+        self.assertEqual(schedd.clusters, 3)
+        self.assertEqual([ad['Arguments'] for ad in schedd.procs], ['-x ' + str(i) for i in range(25)])
+        self.assertEqual(list(SubmittedCluster.objects.order_by('cluster_id').values_list('cluster_id', flat=True)),
+                         [1, 2, 3])
+        self.assertEqual(ProcParameter.objects.filter(cluster_id=1).count(), 25)
+        # the lost cluster was found in the queue, the history was not searched
+        self.assertEqual(schedd.histories, 0)
+
+    def test_submission_is_leased(self):
+        self.add_submission('test_lease')
+        # another worker is submitting the job and keeps renewing its lease
+        Submission.objects.filter(job_name='test_lease').update(status='s', worker='other:1', leased=timezone.now())
+        schedd = FakeSchedd()
+        resume_submissions(schedd, schedd.wait)
+        with self.assertRaises(SubmissionLeaseError):
+            submit(Submission.objects.get(job_name='test_lease'), schedd, schedd.wait)
+        self.assertEqual(schedd.clusters, 0)
+        self.assertEqual(Submission.objects.get(job_name='test_lease').status, 's')
+        self.assertEqual(Job.objects.get(job_name='test_lease').status, 's')
+
+        # the worker stopped renewing its lease, so the job is taken over
+        Submission.objects.filter(job_name='test_lease').update(
+            leased=timezone.now() - timedelta(seconds=spec_factory.SUBMIT_LEASE_TIMEOUT + 1))
+        resume_submissions(schedd, schedd.wait)
+        self.assertEqual(schedd.clusters, 3)
+        submission = Submission.objects.get(job_name='test_lease')
+        self.assertEqual((submission.status, submission.worker), ('d', worker_id()))
+
+    def test_lost_lease_stops_submission(self):
+        submission = self.add_submission('test_lost_lease')
+        schedd = FakeSchedd()
+
+        def take_over(seconds):
+            Submission.objects.filter(job_name='test_lost_lease').update(worker='other:1')
+        spec_factory.SUBMIT_MAX_IDLE = 5
+        with self.assertRaises(SubmissionLeaseError):
+            submit(submission, schedd, take_over)
+        self.assertEqual(schedd.clusters, 1)
+        self.assertEqual(Submission.objects.get(job_name='test_lost_lease').status, 's')
+        self.assertEqual(Job.objects.get(job_name='test_lost_lease').status, 's')
+
+    def test_progress_is_not_stored_without_lease(self):
+        submission = self.add_submission('test_late_worker')
+        schedd = FakeSchedd()
+        submit_many = schedd.submitMany
+
+        def submit_and_lose_lease(cluster_ad, proc_ads, spool=False):
+            cluster_id = submit_many(cluster_ad, proc_ads, spool)
+            Submission.objects.filter(job_name='test_late_worker').update(worker='other:1', submitted=5)
+            return cluster_id
+        schedd.submitMany = submit_and_lose_lease
+        with self.assertRaises(SubmissionLeaseError):
+            submit(submission, schedd, schedd.wait)
+        self.assertEqual(Submission.objects.get(job_name='test_late_worker').submitted, 5)
+        self.assertEqual(SubmittedCluster.objects.filter(job_name='test_late_worker').count(), 0)
+        self.assertEqual(Job.objects.get(job_name='test_late_worker').status, 's')
+
+    def test_view_queues_submission(self):
+        exec_file = open(os.path.abspath(os.path.dirname(__file__)) + '/static/sim/test_files_view/helloworld')
+        post_data = {
+            'values-TOTAL_FORMS': u'1',
+            'values-INITIAL_FORMS': u'0',
+            'values-MIN_NUM_FORMS': u'0',
+            'values-MAX_NUM_FORMS': u'1000',
+            'values-0-type': u'r',
+            'values-0-name': u'one',
+            'values-0-args': u'0, 15, 1',
+            'files-TOTAL_FORMS': u'0',
+            'files-INITIAL_FORMS': u'0',
+            'files-MIN_NUM_FORMS': u'0',
+            'files-MAX_NUM_FORMS': u'1000',
+            'job-job_name': u'testqueue',
+            'job-arg_template': u'-n {one}',
+            'job-exec_file': UploadedFile(file=exec_file, name='helloworld'),
+        }
+        blob_directory = blobs.BLOB_DIRECTORY
+        blobs.BLOB_DIRECTORY = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        with self.settings(FILE_UPLOAD_TEMP_DIR=os.path.join(blobs.BLOB_DIRECTORY, 'tmp')):
+            response = self.client.post('/sim/', post_data)
+        exec_file.close()
+        # the upload was moved into the store without a copy
+        self.assertEqual(os.listdir(os.path.join(blobs.BLOB_DIRECTORY, 'tmp')), [])
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(Submission.objects.get(job_name='testqueue').status, 'q')
+        self.assertEqual(Job.objects.get(job_name='testqueue').cluster_id, -1)
+        self.assertEqual(Job.objects.get(job_name='testqueue').parameters, 'one')
+
+        schedd = FakeSchedd()
+        resume_submissions(schedd, schedd.wait, interrupted=False)
+        self.assertEqual(schedd.clusters, 2)
+        self.assertEqual(schedd.procs[0]['Iwd'], os.path.abspath(os.path.dirname(__file__)) + '/testqueue')
+        status = json.loads(self.client.get('/sim/success/testqueue/status').content)
+        self.assertEqual(status, {'status': 'Done', 'submitted': 15, 'total': 15, 'error': ''})
+        self.assertEqual(self.client.get('/sim/success/testqueue').status_code, 200)
+        self.assertTrue(os.path.samefile(schedd.procs[0]['Cmd'], blob_path(JobFile.objects.get().blob_id)))
+        with open(schedd.procs[0]['Cmd'], 'rb') as file:
+            self.assertEqual(hashlib.sha256(file.read()).hexdigest(), JobFile.objects.get().blob_id)
+        shutil.rmtree(os.path.abspath(os.path.dirname(__file__)) + '/testqueue')
+        shutil.rmtree(blobs.BLOB_DIRECTORY)
+        blobs.BLOB_DIRECTORY = blob_directory
+
+
+class BlobTest(TestCase):
+    def setUp(self):
+        self.blob_directory = blobs.BLOB_DIRECTORY
+        blobs.BLOB_DIRECTORY = tempfile.mkdtemp()
+        self.job_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(blobs.BLOB_DIRECTORY)
+        shutil.rmtree(self.job_directory)
+        blobs.BLOB_DIRECTORY = self.blob_directory
+
+    def test_files_are_stored_once(self):
+        first_dir = os.path.join(self.job_directory, 'first')
+        second_dir = os.path.join(self.job_directory, 'second')
+        os.mkdir(first_dir)
+        os.mkdir(second_dir)
+        first = add_file('first', SimpleUploadedFile('input.txt', 'same content'), first_dir)
+        second = add_file('second', SimpleUploadedFile('data.txt', 'same content'), second_dir)
+        other = add_file('second', SimpleUploadedFile('other.txt', 'other content'), second_dir)
+
+        self.assertEqual(Blob.objects.count(), 2)
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertFalse(os.path.samefile(first, other))
+        with open(second) as file:
+            self.assertEqual(file.read(), 'same content')
+        self.assertEqual(os.listdir(os.path.join(blobs.BLOB_DIRECTORY, 'tmp')), [])
+
+        release_job('second', second_dir)
+        self.assertFalse(os.path.exists(second))
+        self.assertEqual(collect_garbage(0), 1)
+        self.assertEqual(Blob.objects.count(), 1)
+        self.assertTrue(os.path.exists(first))
+        self.assertEqual(collect_garbage(0), 0)
+        release_job('first', first_dir)
+        self.assertEqual(collect_garbage(3600), 0)
+        self.assertEqual(collect_garbage(0), 1)
+        self.assertEqual(Blob.objects.count(), 0)
+
+    def test_ended_jobs_are_released(self):
+        schedd = FakeSchedd()
+        paths = {}
+        for name, status in (('test_done', 'd'), ('test_failed', 'f'), ('test_running', 'r')):
+            Job.objects.create(job_name=name, status=status)
+            os.mkdir(job_directory(name))
+            paths[name] = add_file(name, SimpleUploadedFile(name, name + ' content'), job_directory(name))
+        # a proc of the failed job was submitted before its submission failed, it still needs the files
+        schedd.submitMany(classad.ClassAd({'SporeJob': 'test_failed'}), [(classad.ClassAd(), 1)])
+        try:
+            self.assertEqual(release_jobs(schedd), 1)
+            self.assertFalse(os.path.exists(paths['test_done']))
+            self.assertTrue(os.path.exists(paths['test_failed']))
+            self.assertTrue(os.path.exists(paths['test_running']))
+            self.assertEqual(collect_garbage(0), 1)
+
+            schedd.procs = []
+            self.assertEqual(release_jobs(schedd), 1)
+            self.assertEqual(release_jobs(schedd), 0)
+            self.assertEqual(collect_garbage(0), 1)
+            self.assertEqual(list(Blob.objects.values_list('size', flat=True)), [len('test_running content')])
+        finally:
+            for name in paths:
+                shutil.rmtree(job_directory(name))
@@ -0,0 +1,27 @@
+import os
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class BlobUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streaming every upload, however small, to a temporary file next to the blob store
+    (FILE_UPLOAD_TEMP_DIR) and hashing it on the way, so that sim.blobs.store_blob
+    only has to rename the file and never reads or copies it.
+    """
+    def new_file(self, *args, **kwargs):
+        if not os.path.exists(settings.FILE_UPLOAD_TEMP_DIR):
+            os.makedirs(settings.FILE_UPLOAD_TEMP_DIR)
+        super(BlobUploadHandler, self).new_file(*args, **kwargs)
+        self.sha = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        file = super(BlobUploadHandler, self).file_complete(file_size)
+        file.sha256 = self.sha.hexdigest()
+        return file
@@ -3,5 +3,6 @@ from . import views
 
 urlpatterns = [
     url(r'^$', views.index, name='index'),
-    url(r'^success/(?P<job_name>\w+)', views.success, name='success')
+    url(r'^success/(?P<job_name>\w+)/status$', views.status, name='status'),
+    url(r'^success/(?P<job_name>\w+)', views.success, name='success'),
 ]
@@ -1,11 +1,12 @@
 import gettext
 
-from django.http import HttpResponseRedirect
-from django.shortcuts import render
+from django.http import HttpResponseRedirect, JsonResponse
+from django.shortcuts import render, get_object_or_404
 from django.forms import formset_factory
 from sim.forms import ValueForm, AddFileForm, JobForm
 from django.core.exceptions import ValidationError
 from spec_factory import SpecFactory, JobNameDuplicateError
+from sim.models import Submission
 from django.core.urlresolvers import reverse
 
 
@@ -52,12 +53,16 @@ def index(request):
                     for form in file_formset:
                         file_data.append(form.cleaned_data)
                     try:
-                        factory.run_specs(job_form.cleaned_data, value_data, file_data)
+                        factory.queue_specs(job_form.cleaned_data, value_data, file_data)
                     except JobNameDuplicateError:
-                        pass # TODO Figure out what to do with such exception, though it should never be raised
-                    return HttpResponseRedirect(
-                        reverse('success', kwargs={'job_name': job_form.cleaned_data['job_name']})
-                    )
+                        # The same name was submitted concurrently after the form was validated
+                        job_form.add_error('job_name', ValidationError(
+                            gettext.gettext('This name already exists'),
+                            code='duplicate_job_name'))
+                    else:
+                        return HttpResponseRedirect(
+                            reverse('success', kwargs={'job_name': job_form.cleaned_data['job_name']})
+                        )
     else:
         value_formset = ValueFormSet(prefix='values')
         file_formset = FileFormSet(prefix='files')
@@ -68,4 +73,15 @@ def index(request):
 
 
 def success(request, job_name):
-    return render(request, 'sim/success.html', {'job_name': job_name})
\ No newline at end of file
+    submission = get_object_or_404(Submission, job_name=job_name)
+    return render(request, 'sim/success.html', {'job_name': job_name, 'submission': submission})
+
+
+def status(request, job_name):
+    submission = get_object_or_404(Submission, job_name=job_name)
+    return JsonResponse({
+        'status': submission.get_status_display(),
+        'submitted': submission.submitted,
+        'total': submission.total,
+        'error': submission.error,
+    })
@@ -128,4 +128,82 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
 
-WORKING_DIRECTORY = os.path.dirname(os.getcwd())
\ No newline at end of file
+WORKING_DIRECTORY = os.path.dirname(os.getcwd())
+
+
+# Number of out file lines used to guess result column types before creating a table
+
+PARSER_SAMPLE_SIZE = 1000
+
+
+# Number of rows sent to the database at once while loading an out file
+
+PARSER_BATCH_SIZE = 10000
+
+
+# Number of processes loading out files of finished jobs, or per-proc out files of a job, at once
+
+INGEST_WORKERS = 4
+
+# Number of seconds before the latest processed HTCondor history record to request records from again,
+# since records do not reach the history in the order of their CompletionDate
+
+HISTORY_CHECK_WINDOW = 10 * 60
+
+
+# Number of result rows on a page of the logs detail view, and for how long pages are cached
+
+LOGS_PAGE_SIZE = 100
+
+LOGS_PAGE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Number of jobs in a list on the logs index page, and for how many seconds a list is cached
+
+LOGS_INDEX_SIZE = 50
+
+LOGS_INDEX_CACHE_TIMEOUT = 10
+
+
+# Number of rows fetched from the database at once while exporting results
+
+EXPORT_CHUNK_SIZE = 5000
+
+
+# Number of procs submitted to HTCondor in one cluster, and how many procs of a job
+# may wait in the queue before the next cluster is submitted
+
+SUBMIT_CLUSTER_SIZE = 10000
+
+SUBMIT_MAX_IDLE = 50000
+
+# Number of seconds to wait before checking the queue again when it is full
+
+SUBMIT_POLL_INTERVAL = 30
+
+# Number of seconds after which a submission whose worker has not renewed its lease is taken over by another worker
+
+SUBMIT_LEASE_TIMEOUT = 300
+
+
+# Directory of the content-addressed store of executables and input files, and for how many
+# seconds an unreferenced file is kept there
+
+BLOB_DIRECTORY = os.path.join(WORKING_DIRECTORY, 'blobs')
+
+BLOB_GC_GRACE = 60 * 60
+
+# Uploads are written straight next to the blob store, so that storing them is a rename
+
+FILE_UPLOAD_HANDLERS = ['sim.uploads.BlobUploadHandler']
+
+FILE_UPLOAD_TEMP_DIR = os.path.join(BLOB_DIRECTORY, 'tmp')
+
+
+# Out files of loaded jobs are compressed by blocks of this many bytes, which can be decompressed separately
+
+ARCHIVE_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+# zlib compression level of out files, from 1 (fastest) to 9 (smallest)
+
+ARCHIVE_COMPRESSION_LEVEL = 6